@@ -10,11 +10,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from flask import Flask, redirect
 from routes.inventory import inventory_bp
+from routes.psa import psa_bp
 
 app = Flask(__name__)
 
 # Register blueprints
 app.register_blueprint(inventory_bp, url_prefix='/inventory')
+app.register_blueprint(psa_bp, url_prefix='/psa')
 
 # Redirect root to inventory
 @app.route('/')
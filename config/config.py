@@ -21,7 +21,15 @@ class Config:
         },
         "psa_api": {
             "daily_limit": 100,
-            "reset_hour": 0  # Midnight UTC
+            "reset_hour": 0,  # Midnight UTC
+            "max_workers": 4,  # Certs processed concurrently
+            "rate_limit": {"rate": 1.0, "burst": 5},  # Sustained calls/sec and burst size
+            "max_retries": 3,  # Retries for 429/5xx responses
+            "cache_ttl": {  # Seconds to reuse cached responses per endpoint; 0 disables
+                "cert_details": 30 * 24 * 3600,
+                "cert_images": 7 * 24 * 3600
+            },
+            "logging": {"level": "INFO", "max_bytes": 5 * 1024 * 1024, "backup_count": 5}
         }
     }
     
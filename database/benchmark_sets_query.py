@@ -0,0 +1,79 @@
+"""
+Regression benchmark for InventoryDB.get_sets_by_series.
+Builds a scratch database with 100k slabs and 10k business boxes per set
+in one series, then times the per-series query against a sub-millisecond budget.
+"""
+
+import os
+import sys
+import time
+import tempfile
+from statistics import median
+
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.inventory_db import InventoryDB
+
+SLABS = 100_000
+BOXES_PER_SET = 10_000
+STASHED_PER_SET = 1_000
+RUNS = 200
+BUDGET_MS = 1.0
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = InventoryDB(os.path.join(tmp_dir, 'inventory.db'))
+        series = 'Scarlet And Violet'
+        set_names = [row['name'] for row in db.get_sets_by_series(series)]
+        if not set_names:
+            print("No sets loaded; run from the project root so data/pokemon_sets.json is found")
+            return 1
+        
+        print(f"Populating {len(set_names)} sets: {BOXES_PER_SET} boxes per set, {SLABS} slabs...")
+        with db.conn:
+            for set_name in set_names:
+                db.conn.executemany('''
+                    INSERT INTO business_boxes (set_name, purchase_date, source, price, packs_opened, packs_sold)
+                    VALUES (?, '2025-01-01', 'Benchmark', ?, ?, ?)
+                ''', ((set_name, 40.0 + i % 7 if i % 10 else None, i % 30, i % 5)
+                      for i in range(BOXES_PER_SET)))
+                db.conn.executemany('''
+                    INSERT INTO stashed_boxes (set_name, purchase_date, source, price)
+                    VALUES (?, '2025-01-01', 'Benchmark', 40.0)
+                ''', ((set_name,) for _ in range(STASHED_PER_SET)))
+            db.conn.executemany('''
+                INSERT INTO slabs (cert_number, set_name, status) VALUES (?, ?, 'Submitted')
+            ''', ((str(100000000 + i), set_names[i % len(set_names)]) for i in range(SLABS)))
+        
+        # Check the figures against direct counts so fan-out cannot creep back in
+        rows = {row['name']: row for row in db.get_sets_by_series(series)}
+        for set_name in set_names:
+            expected_slabs = db.conn.execute(
+                'SELECT COUNT(*) FROM slabs WHERE set_name = ?', (set_name,)).fetchone()[0]
+            # Boxes without a price are left out of the average, as AVG() does
+            expected_avg = db.conn.execute(
+                'SELECT ROUND(AVG(price), 2) FROM business_boxes WHERE set_name = ?', (set_name,)).fetchone()[0]
+            row = rows[set_name]
+            assert row['business_boxes'] == BOXES_PER_SET, row['business_boxes']
+            assert row['stashed_boxes'] == STASHED_PER_SET, row['stashed_boxes']
+            assert row['slab_count'] == expected_slabs, row['slab_count']
+            assert row['avg_box_price'] == expected_avg, (row['avg_box_price'], expected_avg)
+        
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            db.get_sets_by_series(series)
+            timings.append((time.perf_counter() - start) * 1000)
+        db.close()
+    
+    result = median(timings)
+    print(f"get_sets_by_series('{series}'): median {result:.3f} ms, max {max(timings):.3f} ms over {RUNS} runs")
+    if result > BUDGET_MS:
+        print(f"FAILED: median exceeds {BUDGET_MS} ms budget")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
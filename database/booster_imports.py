@@ -2,46 +2,45 @@
 Import handler for booster box purchases
 """
 
-import os
-import json
-from datetime import datetime
-from typing import Tuple, List, Dict
+import hashlib
+import logging
+from typing import Tuple, List, Dict, Optional
 from database.inventory_db import InventoryDB
+from database.set_resolver import get_set_resolver
+from database.csv_ingest import Column, Schema, Record, IngestReport, read_batches, parse_currency, parse_date, parse_int
 
-def load_sets_database() -> Dict[str, str]:
-    """Load the sets database and create a mapping of normalized names to actual names"""
-    sets_map = {}
-    try:
-        with open('data/pokemon_sets.json', 'r') as f:
-            data = json.load(f)
-            for series_data in data['series'].values():
-                for set_info in series_data.get('main_sets', []):
-                    set_name = set_info['name']
-                    # Create mapping for both normal and normalized versions
-                    sets_map[set_name.lower()] = set_name
-                    # Also map without 'ex' if it exists
-                    if ' ex' in set_name.lower():
-                        sets_map[set_name.lower().replace(' ex', '')] = set_name
-    except Exception as e:
-        print(f"Error loading sets database: {str(e)}")
-        return {}
-    return sets_map
+logger = logging.getLogger(__name__)
 
-def normalize_set_name(name: str, sets_map: Dict[str, str]) -> str:
-    """Normalize set name to match database format"""
-    normalized = name.lower().strip()
-    # Try exact match first
-    if normalized in sets_map:
-        return sets_map[normalized]
-    # Try without 'ex' if present
-    if ' ex' in normalized:
-        base_name = normalized.replace(' ex', '')
-        if base_name in sets_map:
-            return sets_map[base_name]
-    # Return original if no match found
-    return name
+BOOSTER_PURCHASE_SCHEMA = Schema([
+    Column("Source"),
+    Column("Purchase Date", parse_date),
+    Column("Boxes Purchased", parse_int),
+    Column("Business Boxes", parse_int),
+    Column("Stashed Boxes", parse_int),
+    Column("Per Box USD", parse_currency, aliases=["Price Per Box"]),
+    Column("Set"),
+    Column("Packs Per Box", parse_int),
+    Column("order_id", required=False)
+], positional=["Source", "Purchase Date", "Boxes Purchased", "Business Boxes", "Stashed Boxes",
+               "Per Box USD", "Total", "Set", "Packs Per Box", "Business Packs"])
+
+def purchase_row_key(row: List[str], order_id: Optional[str], seen: Dict[str, int]) -> str:
+    """
+    Compute a stable identity for a purchase row
+    
+    Uses the order_id column when the file has one, otherwise a hash of the
+    row content plus its occurrence count so far in the file (tracked in
+    seen), so identical purchases on the same day stay distinct and
+    re-importing a file reproduces the same keys.
+    """
+    if order_id:
+        return f"order:{order_id}"
+    digest = hashlib.sha1('\x1f'.join(p.strip() for p in row).encode('utf-8')).hexdigest()
+    seen[digest] = seen.get(digest, 0) + 1
+    return f"sha1:{digest}:{seen[digest]}"
 
-def import_booster_purchases(db: InventoryDB, file_path: str) -> Tuple[bool, List[str], List[str]]:
+def import_booster_purchases(db: InventoryDB, file_path: str, delta: bool = True,
+                             batch_size: int = 5000) -> Tuple[bool, List[str], List[str]]:
     """
     Import booster box purchases from CSV
     
@@ -49,145 +48,168 @@ def import_booster_purchases(db: InventoryDB, file_path: str) -> Tuple[bool, Lis
     Source,Purchase Date,Boxes Purchased,Business Boxes,Stashed Boxes,Per Box USD,Total,Set,Packs Per Box,Business Packs
     Swivel,2025-02-07,2,2,0,$38.00,$76.00,Mask of Change,30,60
     
+    The file is read with BOOSTER_PURCHASE_SCHEMA; rows that fail type
+    checks, or whose box counts do not add up, are skipped and logged with
+    their line number.
+    
+    Each row is identified by purchase_row_key() and recorded in
+    booster_purchases. In delta mode only rows not imported before are
+    inserted, so existing boxes keep their packs_opened/packs_sold progress.
+    With delta=False all boxes and purchase records are cleared and the file
+    is replayed in full.
+    
+    A database whose boxes were imported before booster_purchases existed
+    has boxes but no keys. On its first delta import, a new row whose boxes
+    (same set, date, source and price) are already in business_boxes and
+    stashed_boxes is adopted. Its key is recorded without inserting boxes a
+    second time, so existing progress is kept and counts are not doubled.
+    
+    Boxes are written with executemany in batches of batch_size, all inside
+    a single transaction. Per-row details are logged at DEBUG level and a
+    summary at INFO level with the totals in the record's `import_summary`
+    attribute.
+    
     Returns:
     - success: bool
     - unmatched_sets: List of set names not found in database
     - duplicate_entries: List of entries already in database
     """
-    try:
-        unmatched_sets = []
-        duplicate_entries = []
-        
-        # Load sets mapping
-        sets_map = load_sets_database()
-        print("Loaded sets mapping:", sets_map)  # Debug
-        
-        print(f"Opening file: {file_path}")  # Debug
-        
-        # First, let's aggregate all purchases by set
-        set_totals = {}
+    unmatched_sets = []
+    duplicate_entries = []
+    set_totals = {}
+    packs_per_box_by_set = {}
+    seen = {}
+    report = IngestReport(file_path)
+    
+    # Resolve set names once up front instead of querying per line
+    resolver = get_set_resolver()
+    known_sets = {row[0] for row in db.conn.execute('SELECT name FROM sets')}
+    logger.debug("Importing booster purchases from %s (delta=%s)", file_path, delta)
+    
+    # Boxes not yet claimed by a purchase key, counted by (table, set, date, source, price)
+    untracked = {}
+    if delta and not db.conn.execute('SELECT 1 FROM booster_purchases LIMIT 1').fetchone():
+        for table in ('business_boxes', 'stashed_boxes'):
+            for row in db.conn.execute(f'''
+                SELECT set_name, purchase_date, source, ROUND(price, 2), COUNT(*)
+                FROM {table} GROUP BY 1, 2, 3, 4
+            '''):
+                untracked[(table, *tuple(row)[:4])] = row[4]
+    adopted = []
+    
+    def write_batch(records: List[Record]):
+        """Insert purchases in a batch that have not been imported before"""
+        pending = []
+        for record in records:
+            (source, purchase_date, total_boxes, business_boxes, stashed_boxes,
+             price_per_box, raw_set_name, packs_per_box, order_id) = record.values
+            set_name = resolver.resolve(raw_set_name) or raw_set_name
+            
+            logger.debug("Line %d: %s %s %s business=%d stashed=%d price=%.2f packs/box=%d",
+                         record.line, source, purchase_date, set_name,
+                         business_boxes, stashed_boxes, price_per_box, packs_per_box)
+            
+            # Verify total boxes matches sum of business and stashed
+            if total_boxes != (business_boxes + stashed_boxes):
+                report.reject(record.line, f"total boxes ({total_boxes}) doesn't match sum of "
+                                           f"business ({business_boxes}) and stashed ({stashed_boxes})")
+                continue
+            
+            if set_name not in known_sets:
+                if set_name not in unmatched_sets:
+                    logger.warning("Set not found: %s", set_name)
+                    unmatched_sets.append(set_name)
+                continue
+            
+            packs_per_box_by_set[set_name] = packs_per_box
+            pending.append((purchase_row_key(record.raw, order_id, seen), record,
+                            (set_name, purchase_date, source, price_per_box, business_boxes, stashed_boxes)))
         
-        # Clear existing data
-        with db.conn:
-            db.conn.execute('DELETE FROM business_boxes')
-            db.conn.execute('DELETE FROM stashed_boxes')
+        keys = [key for key, _, _ in pending]
+        existing = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            existing.update(r[0] for r in db.conn.execute(
+                f"SELECT row_key FROM booster_purchases WHERE row_key IN ({','.join('?' * len(chunk))})",
+                chunk))
         
-        with open(file_path, 'r') as f:
-            # Skip header
-            header = next(f)
-            print(f"Header: {header}")  # Debug
+        purchases = []
+        business_rows = []
+        stashed_rows = []
+        for key, record, parsed in pending:
+            set_name, purchase_date, source, price_per_box, business_boxes, stashed_boxes = parsed
+            if key in existing:
+                duplicate_entries.append(f"line {record.line}: {','.join(record.raw)}")
+                continue
+            existing.add(key)
+            purchases.append((key, set_name, purchase_date, source, price_per_box,
+                              business_boxes, stashed_boxes))
+            box = (set_name, purchase_date, source, price_per_box)
             
-            for line_num, line in enumerate(f, 2):
-                print(f"\nProcessing line {line_num}: {line.strip()}")  # Debug
-                
-                # Parse CSV line
-                parts = [p.strip().strip('"$,') for p in line.strip().split(',')]
-                if len(parts) < 10:  # Updated for new column count
-                    print(f"Skipping line {line_num}: insufficient columns")
-                    continue
-                
-                try:
-                    source = parts[0]
-                    date_str = parts[1]
-                    total_boxes = int(parts[2])  # Boxes Purchased
-                    business_boxes = int(parts[3])  # Business Boxes
-                    stashed_boxes = int(parts[4])  # Stashed Boxes
-                    price_per_box = float(parts[5].replace('$', '').replace(',', '').strip())
-                    set_name = normalize_set_name(parts[7], sets_map)
-                    packs_per_box = int(parts[8])
-                    
-                    print(f"Parsed values:")  # Debug
-                    print(f"  Source: {source}")
-                    print(f"  Date: {date_str}")
-                    print(f"  Total Boxes: {total_boxes}")
-                    print(f"  Business Boxes: {business_boxes}")
-                    print(f"  Stashed Boxes: {stashed_boxes}")
-                    print(f"  Price/Box: {price_per_box}")
-                    print(f"  Set: {set_name}")
-                    print(f"  Packs/Box: {packs_per_box}")
-                    
-                    # Verify total boxes matches sum of business and stashed
-                    if total_boxes != (business_boxes + stashed_boxes):
-                        print(f"Warning: Total boxes ({total_boxes}) doesn't match sum of business ({business_boxes}) and stashed ({stashed_boxes})")
-                        continue
-                    
-                    # Verify set exists
-                    set_exists = db.conn.execute('''
-                        SELECT 1 FROM sets WHERE name = ?
-                    ''', (set_name,)).fetchone()
-                    
-                    if not set_exists:
-                        print(f"Set not found: {set_name}")  # Debug
-                        if set_name not in unmatched_sets:
-                            unmatched_sets.append(set_name)
-                        continue
-                    
-                    # Update packs per box
-                    with db.conn:
-                        db.conn.execute('''
-                            UPDATE sets 
-                            SET packs_per_box = ?
-                            WHERE name = ?
-                        ''', (packs_per_box, set_name))
-                        
-                        # Insert business boxes
-                        for _ in range(business_boxes):
-                            db.conn.execute('''
-                                INSERT INTO business_boxes (
-                                    set_name, purchase_date, source, price,
-                                    packs_opened, packs_sold
-                                ) VALUES (?, ?, ?, ?, 0, 0)
-                            ''', (
-                                set_name,
-                                datetime.strptime(date_str, '%Y-%m-%d').date(),
-                                source,
-                                price_per_box
-                            ))
-                        
-                        # Insert stashed boxes
-                        for _ in range(stashed_boxes):
-                            db.conn.execute('''
-                                INSERT INTO stashed_boxes (
-                                    set_name, purchase_date, source, price
-                                ) VALUES (?, ?, ?, ?)
-                            ''', (
-                                set_name,
-                                datetime.strptime(date_str, '%Y-%m-%d').date(),
-                                source,
-                                price_per_box
-                            ))
-                    
-                    # Track totals for verification
-                    if set_name not in set_totals:
-                        set_totals[set_name] = {
-                            'business': 0,
-                            'stashed': 0,
-                            'total': 0,
-                            'price': 0
-                        }
-                    set_totals[set_name]['business'] += business_boxes
-                    set_totals[set_name]['stashed'] += stashed_boxes
-                    set_totals[set_name]['total'] += total_boxes
-                    set_totals[set_name]['price'] = price_per_box  # Keep most recent price
-                    
-                except ValueError as e:
-                    print(f"Error processing line {line_num}: {str(e)}")  # Debug
+            if untracked:
+                business_key = ('business_boxes', set_name, purchase_date, source, round(price_per_box, 2))
+                stashed_key = ('stashed_boxes', set_name, purchase_date, source, round(price_per_box, 2))
+                if (untracked.get(business_key, 0) >= business_boxes
+                        and untracked.get(stashed_key, 0) >= stashed_boxes):
+                    # Imported before keys were recorded: claim the existing boxes
+                    untracked[business_key] = untracked.get(business_key, 0) - business_boxes
+                    untracked[stashed_key] = untracked.get(stashed_key, 0) - stashed_boxes
+                    adopted.append(key)
                     continue
-                except Exception as e:
-                    print(f"Unexpected error on line {line_num}: {str(e)}")  # Debug
-                    raise
+            
+            business_rows.extend([box] * business_boxes)
+            stashed_rows.extend([box] * stashed_boxes)
+            
+            # Track totals for verification
+            totals = set_totals.setdefault(set_name, {'business': 0, 'stashed': 0, 'total': 0, 'price': 0})
+            totals['business'] += business_boxes
+            totals['stashed'] += stashed_boxes
+            totals['total'] += business_boxes + stashed_boxes
+            totals['price'] = price_per_box  # Keep most recent price
         
-        # Print final totals for verification
-        print("\nFinal totals:")
-        for set_name, totals in set_totals.items():
-            print(f"{set_name}:")
-            print(f"  Total boxes: {totals['total']}")
-            print(f"  Business boxes: {totals['business']}")
-            print(f"  Stashed boxes: {totals['stashed']}")
-            print(f"  Price per box: ${totals['price']:.2f}")
+        db.conn.executemany('''
+            INSERT INTO booster_purchases (
+                row_key, set_name, purchase_date, source, price,
+                business_boxes, stashed_boxes, imported_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', purchases)
+        db.conn.executemany('''
+            INSERT INTO business_boxes (
+                set_name, purchase_date, source, price,
+                packs_opened, packs_sold
+            ) VALUES (?, ?, ?, ?, 0, 0)
+        ''', business_rows)
+        db.conn.executemany('''
+            INSERT INTO stashed_boxes (
+                set_name, purchase_date, source, price
+            ) VALUES (?, ?, ?, ?)
+        ''', stashed_rows)
+    
+    try:
+        with db.conn:
+            if not delta:
+                # Clear existing data
+                db.conn.execute('DELETE FROM business_boxes')
+                db.conn.execute('DELETE FROM stashed_boxes')
+                db.conn.execute('DELETE FROM booster_purchases')
+            
+            for records in read_batches(file_path, BOOSTER_PURCHASE_SCHEMA, report, batch_size):
+                write_batch(records)
+            
+            db.conn.executemany('''
+                UPDATE sets 
+                SET packs_per_box = ?
+                WHERE name = ?
+            ''', [(packs, name) for name, packs in packs_per_box_by_set.items()])
         
+        for error in report.errors:
+            logger.warning("Skipped %s", error)
+        logger.info("Imported booster purchases for %d sets from %s (%d duplicates skipped, "
+                    "%d existing purchases adopted, %d rows rejected)",
+                    len(set_totals), file_path, len(duplicate_entries), len(adopted), report.rows_rejected,
+                    extra={"import_summary": set_totals})
         return True, unmatched_sets, duplicate_entries
         
     except Exception as e:
-        print(f"Error importing booster purchases: {str(e)}")  # Debug
-        raise
\ No newline at end of file
+        logger.error("Error importing booster purchases: %s", e)
+        raise
@@ -0,0 +1,110 @@
+"""
+SQLite connection pooling for the inventory database
+"""
+
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, List, Tuple
+
+# Applied to every new connection. WAL lets readers proceed while an import
+# holds the write lock; NORMAL sync is durable across application crashes in WAL mode.
+DEFAULT_PRAGMAS: List[Tuple[str, object]] = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),      # 16 MB page cache per connection
+    ("mmap_size", 268435456),    # 256 MB memory-mapped I/O
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000)       # wait for a writer rather than failing with "database is locked"
+]
+
+class _Lease:
+    """A connection held by one thread; returned to the pool when the thread exits"""
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self.conn = conn
+        self._finalizer = weakref.finalize(self, pool._checkin, conn)
+
+    def release(self):
+        """Return the connection to the pool now"""
+        self._finalizer()
+
+class ConnectionPool:
+    """Pool of SQLite connections handed out one per thread
+
+    A thread borrows a connection the first time it asks for one and keeps it
+    until it calls release() or exits, so request threads reuse warm
+    connections instead of reconnecting.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 8):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        # Schema version confirmed by database.migrations, so repeat opens skip the check
+        self.schema_version = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in DEFAULT_PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Take an idle connection or open a new one"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _checkin(self, conn: sqlite3.Connection):
+        """Return a connection to the idle list"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            lease = _Lease(self, self._checkout())
+            self._local.lease = lease
+        return lease.conn
+
+    def release(self):
+        """Return the calling thread's connection to the pool"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            self._local.lease = None
+            lease.release()
+
+    def close(self):
+        """Release the calling thread's connection and close idle connections"""
+        self.release()
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Get the shared pool for a database file"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
@@ -0,0 +1,219 @@
+"""
+Typed, validated CSV ingestion shared by the importers
+"""
+
+import csv
+import re
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+class CoercionError(ValueError):
+    """Raised by a column type when a value cannot be converted"""
+
+def parse_str(value: str) -> str:
+    """Text, as given (cells are already stripped of whitespace and quotes)"""
+    return value
+
+def parse_int(value: str) -> int:
+    """Whole number, allowing thousands separators"""
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        raise CoercionError(f"not a whole number: {value!r}")
+
+def parse_currency(value: str) -> float:
+    """Amount such as 38, $38.00, "$1,234.50" or ($2.00) for a negative amount"""
+    text = value.replace('$', '').replace(',', '').replace('USD', '').strip()
+    negative = text.startswith('(') and text.endswith(')')
+    try:
+        amount = float(text.strip('()') or 0)
+    except ValueError:
+        raise CoercionError(f"not an amount: {value!r}")
+    return -amount if negative else amount
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%b %d, %Y', '%d-%b-%y')
+
+def parse_date(value: str) -> str:
+    """Date in one of DATE_FORMATS, returned as an ISO date string"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise CoercionError(f"not a date: {value!r}")
+
+_GRADE_PATTERN = re.compile(r'^(?:PSA\s*)?(?:[A-Z][A-Z -]*\s)?(\d{1,2}(?:\.[05])?)$', re.IGNORECASE)
+
+def parse_grade(value: str) -> Union[int, float]:
+    """PSA grade such as "PSA 10", "GEM MT 10", "NM-MT 8.5" or "9"
+
+    Whole grades are returned as int and half grades as float, the way
+    InventoryDB.save_slab_details stores them.
+    """
+    match = _GRADE_PATTERN.match(value)
+    grade = float(match.group(1)) if match else 0
+    if not 1 <= grade <= 10:
+        raise CoercionError(f"not a PSA grade: {value!r}")
+    return int(grade) if grade.is_integer() else grade
+
+class Column:
+    """A CSV column: its header name, type and whether a value is required"""
+
+    def __init__(self, name: str, parse: Callable[[str], Any] = parse_str, required: bool = True,
+                 default: Any = None, aliases: Sequence[str] = ()):
+        self.name = name
+        self.parse = parse
+        self.required = required
+        self.default = default
+        self.aliases = aliases
+
+    @property
+    def keys(self) -> List[str]:
+        return [normalize_header(n) for n in (self.name, *self.aliases)]
+
+def normalize_header(name: str) -> str:
+    return ' '.join(name.strip().strip('\'"').lower().replace('_', ' ').split())
+
+class Schema:
+    """Declarative layout of a CSV file
+
+    Columns are matched to the file's header by name (case-insensitive,
+    ignoring quotes, underscores and extra spaces). A file whose header does
+    not contain every required column is read positionally in the order the
+    columns were declared; `positional` can add placeholder names for
+    columns that are skipped.
+    """
+
+    def __init__(self, columns: Sequence[Column], positional: Optional[Sequence[str]] = None):
+        self.columns = list(columns)
+        self.positional = list(positional) if positional else [c.name for c in self.columns]
+
+    def resolve(self, header: Sequence[str]) -> Tuple[List[Optional[int]], bool]:
+        """Column indexes for a header row, and whether the header was recognized"""
+        names = [normalize_header(h) for h in header]
+        indexes = []
+        for column in self.columns:
+            index = next((names.index(key) for key in column.keys if key in names), None)
+            if index is None and column.required:
+                break
+            indexes.append(index)
+        else:
+            return indexes, True
+
+        positions = [normalize_header(n) for n in self.positional]
+        return [positions.index(normalize_header(c.name)) if normalize_header(c.name) in positions else None
+                for c in self.columns], False
+
+class RowError:
+    """One rejected row"""
+
+    def __init__(self, line: int, column: Optional[str], value: Optional[str], message: str):
+        self.line = line
+        self.column = column
+        self.value = value
+        self.message = message
+
+    def __str__(self) -> str:
+        where = f" [{self.column}]" if self.column else ""
+        return f"line {self.line}{where}: {self.message}"
+
+class IngestReport:
+    """Counts and row-level errors of one import"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.rows_read = 0
+        self.errors: List[RowError] = []
+
+    def reject(self, line: int, message: str, column: Optional[str] = None, value: Optional[str] = None):
+        """Record a row that was skipped"""
+        self.errors.append(RowError(line, column, value, message))
+
+    @property
+    def rows_rejected(self) -> int:
+        return len({error.line for error in self.errors})
+
+    @property
+    def rows_accepted(self) -> int:
+        return self.rows_read - self.rows_rejected
+
+    def summary(self) -> str:
+        return (f"{self.file_path}: {self.rows_read} rows read, {self.rows_accepted} accepted, "
+                f"{self.rows_rejected} rejected")
+
+class Record:
+    """A validated row: its line number, typed values and the raw cells"""
+
+    __slots__ = ('line', 'values', 'raw')
+
+    def __init__(self, line: int, values: Tuple, raw: List[str]):
+        self.line = line
+        self.values = values
+        self.raw = raw
+
+def read_batches(file_path: str, schema: Schema, report: IngestReport,
+                 batch_size: int = 5000) -> Iterator[List[Record]]:
+    """
+    Stream a CSV file as batches of validated records
+
+    The first line is treated as the header. Rows are read with the csv
+    module, so quoted commas are handled. Each batch is coerced column by
+    column; a row with a missing required value or a value its column type
+    rejects is left out of the batch and recorded in the report. Blank
+    lines are ignored.
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        # The first line is always a header; unrecognized headers fall back to positions
+        indexes, _ = schema.resolve(next(reader, []))
+
+        batch: List[Tuple[int, List[str]]] = []
+        for line, row in enumerate(reader, 2):
+            if not any(cell.strip() for cell in row):
+                continue
+            report.rows_read += 1
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                yield _coerce(batch, schema, indexes, report)
+                batch = []
+        if batch:
+            yield _coerce(batch, schema, indexes, report)
+
+def _coerce(batch: List[Tuple[int, List[str]]], schema: Schema, indexes: List[Optional[int]],
+            report: IngestReport) -> List[Record]:
+    """Convert a batch column by column, dropping rows that fail"""
+    failed = set()
+    columns = []
+    for column, index in zip(schema.columns, indexes):
+        parse = column.parse
+        values = []
+        for line, row in batch:
+            raw = row[index].strip().strip('\'"') if index is not None and index < len(row) else ''
+            if not raw:
+                if column.required:
+                    failed.add(line)
+                    report.reject(line, "missing value", column.name)
+                values.append(column.default)
+                continue
+            try:
+                values.append(parse(raw))
+            except (CoercionError, ValueError) as e:
+                failed.add(line)
+                report.reject(line, str(e), column.name, raw)
+                values.append(None)
+        columns.append(values)
+
+    return [
+        Record(line, tuple(values), row)
+        for (line, row), values in zip(batch, zip(*columns))
+        if line not in failed
+    ]
+
+def ingest(file_path: str, schema: Schema, write_batch: Callable[[List[Record]], None],
+           batch_size: int = 5000) -> IngestReport:
+    """Read file_path with schema and hand each batch of valid records to write_batch"""
+    report = IngestReport(file_path)
+    for records in read_batches(file_path, schema, report, batch_size):
+        if records:
+            write_batch(records)
+    return report
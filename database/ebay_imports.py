@@ -2,10 +2,89 @@
 Import handler for eBay sales data
 """
 
-from datetime import datetime
+import hashlib
+from typing import Dict, List, Optional, Sequence
 from database.inventory_db import InventoryDB
+from database.set_resolver import get_set_resolver
+from database.sales_analytics import update_sales_analysis
+from database.csv_ingest import Column, Schema, Record, ingest, parse_currency, parse_date, parse_int
 
-def import_ebay_sales(db: InventoryDB, file_path: str) -> bool:
+EBAY_SALES_SCHEMA = Schema([
+    Column("set_name"),
+    Column("quantity", parse_int),
+    Column("sale_price", parse_currency),
+    Column("shipping_charged", parse_currency, required=False, default=0.0),
+    Column("shipping_cost", parse_currency, required=False, default=0.0),
+    Column("ebay_fees", parse_currency, required=False, default=0.0),
+    Column("date", parse_date, aliases=["sale_date"]),
+    Column("order_id", required=False, aliases=["order number", "sales record number"])
+])
+
+def sale_row_key(values: Sequence, order_id: Optional[str], seen: Dict[str, int]) -> str:
+    """
+    Compute a stable identity for a sale
+    
+    values are the stored pack_sales columns (set_name, quantity, sale_price,
+    shipping_charged, shipping_cost, ebay_fees, sale_date). The base is the
+    order ID when the export has one, otherwise a hash of the values. The
+    occurrence count of the base so far (tracked in seen) is appended, so
+    identical sales on the same day, or several lines of one order, stay
+    distinct while every export containing them reproduces the same keys.
+    """
+    if order_id:
+        base = f"order:{order_id}"
+    else:
+        set_name, quantity, sale_price, shipping_charged, shipping_cost, ebay_fees, sale_date = values
+        text = '\x1f'.join([
+            set_name, str(int(quantity)), f"{float(sale_price):.2f}", f"{float(shipping_charged):.2f}",
+            f"{float(shipping_cost):.2f}", f"{float(ebay_fees):.2f}", str(sale_date)[:10]
+        ])
+        base = f"sha1:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+    seen[base] = seen.get(base, 0) + 1
+    return f"{base}:{seen[base]}"
+
+def backfill_sale_keys(db: InventoryDB) -> int:
+    """
+    Give sales imported before row keys existed their key
+    
+    Rows are keyed in insertion order with sale_row_key(), matching what a
+    re-import of the same export computes. Older imports stored the set name
+    as written in the CSV, so the name is resolved the way import_ebay_sales
+    resolves it before hashing. Returns the number of rows keyed.
+    """
+    if not db.conn.execute('SELECT 1 FROM pack_sales WHERE row_key IS NULL LIMIT 1').fetchone():
+        return 0
+    
+    resolver = get_set_resolver()
+    seen = {}
+    taken = {row[0] for row in db.conn.execute('SELECT row_key FROM pack_sales WHERE row_key IS NOT NULL')}
+    updates = []
+    for row in db.conn.execute('''
+        SELECT id, set_name, quantity, sale_price, shipping_charged, shipping_cost, ebay_fees, sale_date
+        FROM pack_sales WHERE row_key IS NULL ORDER BY id
+    '''):
+        set_name, *values = tuple(row)[1:]
+        values = (resolver.resolve(set_name) or set_name, *values)
+        key = sale_row_key(values, None, seen)
+        while key in taken:
+            key = sale_row_key(values, None, seen)
+        taken.add(key)
+        updates.append((key, row['id']))
+    
+    with db.conn:
+        db.conn.executemany('UPDATE pack_sales SET row_key = ? WHERE id = ?', updates)
+    return len(updates)
+
+def file_hash(file_path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def import_ebay_sales(db: InventoryDB, file_path: str, source: str = 'ebay',
+                      batch_size: int = 5000) -> bool:
     """
     Import eBay sales data from CSV
     
@@ -13,43 +92,129 @@ def import_ebay_sales(db: InventoryDB, file_path: str) -> bool:
     set_name,quantity,sale_price,shipping_charged,shipping_cost,ebay_fees,date
     Pokemon Japanese SV9-Battle Partners,2,15.99,4.99,3.50,2.50,2025-04-18
     
+    The file is read with EBAY_SALES_SCHEMA. Each sale is identified by
+    sale_row_key() and stored once, so importing overlapping exports never
+    double-counts a sale. While the table holds sales keyed by value hash
+    (those imported before row keys, or from exports without order IDs), a
+    row with an order ID is also matched on its value hash; a match is
+    re-keyed by order ID instead of being inserted again.
+    
+    The import_watermarks row for source records the hash of the last file
+    and the latest sale date imported. An unchanged file is skipped without
+    being parsed, and rows dated before the watermark date are skipped
+    without a database lookup, so a rolling re-export only costs its newest
+    rows. Rows on the watermark date itself are still checked by key, since
+    that day may have been exported while still in progress.
+    
+    New rows are inserted with executemany in a single transaction.
+    Afterwards the sales summary is recomputed for the sets that received
+    new rows and data/sales_analysis.csv is rewritten.
+    
     Returns:
     - success: bool
     """
+    touched_sets = set()
+    unmatched_sets = set()
+    seen = {}
+    seen_values = {}
+    counts = {'imported': 0, 'duplicates': 0, 'before_watermark': 0}
     try:
-        with open(file_path, 'r') as f:
-            # Skip header
-            next(f)
+        backfill_sale_keys(db)
+        
+        content_hash = file_hash(file_path)
+        watermark = db.conn.execute(
+            'SELECT file_hash, last_sale_date FROM import_watermarks WHERE source = ?', (source,)
+        ).fetchone()
+        if watermark and watermark['file_hash'] == content_hash:
+            print(f"Skipped {file_path}: already imported for {source}")
+            return True
+        since = watermark['last_sale_date'] if watermark else None
+        last_sale_date = since
+        
+        # Sales keyed by value hash (e.g. backfilled legacy rows) are matched by value too
+        value_keyed = db.conn.execute(
+            "SELECT 1 FROM pack_sales WHERE row_key >= 'sha1:' AND row_key < 'sha1;' LIMIT 1"
+        ).fetchone() is not None
+        
+        resolver = get_set_resolver()
+        
+        def write_batch(records: List[Record]):
+            nonlocal last_sale_date
+            pending = []
+            for record in records:
+                raw_set_name, *values, order_id = record.values
+                sale_date = values[-1]
+                if since and sale_date < since:
+                    counts['before_watermark'] += 1
+                    continue
+                set_name = resolver.resolve(raw_set_name)
+                if not set_name:
+                    if raw_set_name not in unmatched_sets:
+                        print(f"Set not found: {raw_set_name}")
+                        unmatched_sets.add(raw_set_name)
+                    set_name = raw_set_name
+                row = (set_name, *values)
+                value_key = sale_row_key(row, None, seen_values) if order_id and value_keyed else None
+                pending.append((sale_row_key(row, order_id, seen), value_key, row))
+                if last_sale_date is None or sale_date > last_sale_date:
+                    last_sale_date = sale_date
+            
+            keys = [key for key, _, _ in pending] + [value_key for _, value_key, _ in pending if value_key]
+            existing = set()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                existing.update(r[0] for r in db.conn.execute(
+                    f"SELECT row_key FROM pack_sales WHERE row_key IN ({','.join('?' * len(chunk))})",
+                    chunk))
             
-            for line in f:
-                # Parse CSV line
-                parts = line.strip().split(',')
-                if len(parts) < 7:
+            rows = []
+            rekeyed = []
+            for key, value_key, row in pending:
+                if key in existing:
+                    counts['duplicates'] += 1
                     continue
-                
-                set_name, quantity, sale_price, shipping_charged, shipping_cost, fees, date_str = parts[:7]
-                try:
-                    # Parse date
-                    sale_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    
-                    # Insert sale
-                    with db.conn:
-                        db.conn.execute('''
-                            INSERT INTO pack_sales (
-                                set_name, quantity, sale_price, shipping_charged,
-                                shipping_cost, ebay_fees, sale_date
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            set_name, quantity, sale_price, shipping_charged,
-                            shipping_cost, fees, sale_date
-                        ))
-                        
-                except ValueError:
-                    print(f"Error parsing date: {date_str}")
+                if value_key in existing:
+                    # Stored before its order ID was known; key it by order ID from now on
+                    counts['duplicates'] += 1
+                    existing.discard(value_key)
+                    existing.add(key)
+                    rekeyed.append((key, value_key))
                     continue
+                existing.add(key)
+                touched_sets.add(row[0])
+                rows.append((*row, key))
+            
+            db.conn.executemany('UPDATE pack_sales SET row_key = ? WHERE row_key = ?', rekeyed)
+            db.conn.executemany('''
+                INSERT INTO pack_sales (
+                    set_name, quantity, sale_price, shipping_charged,
+                    shipping_cost, ebay_fees, sale_date, row_key
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (row_key) DO NOTHING
+            ''', rows)
+            counts['imported'] += len(rows)
         
-        return True
+        with db.conn:
+            report = ingest(file_path, EBAY_SALES_SCHEMA, write_batch, batch_size)
+            db.conn.execute('''
+                INSERT INTO import_watermarks (source, file_hash, last_sale_date, rows_imported, imported_at)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                ON CONFLICT (source) DO UPDATE SET
+                    file_hash = excluded.file_hash,
+                    last_sale_date = excluded.last_sale_date,
+                    rows_imported = rows_imported + excluded.rows_imported,
+                    imported_at = excluded.imported_at
+            ''', (source, content_hash, last_sale_date, counts['imported']))
         
+        for error in report.errors:
+            print(f"Skipped {error}")
+        skipped = f", {counts['before_watermark']} dated before {since}" if since else ""
+        print(f"Imported {counts['imported']} new eBay sales, {counts['duplicates']} already imported"
+              f"{skipped} ({report.summary()})")
+        if touched_sets:
+            update_sales_analysis(db, touched_sets)
+        return True
+    
     except Exception as e:
         print(f"Error importing eBay sales: {str(e)}")
-        return False
\ No newline at end of file
+        return False
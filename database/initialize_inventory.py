@@ -4,6 +4,7 @@ Initialize the inventory database with set information
 
 import os
 import json
+import uuid
 from datetime import datetime
 
 def initialize_inventory():
@@ -18,6 +19,7 @@ def initialize_inventory():
         "metadata": {
             "last_updated": datetime.now().isoformat(),
             "version": "1.0",
+            "generation": uuid.uuid4().hex,
             "initialized_from": "pokemon_sets.json"
         },
         "opened": {
@@ -123,6 +125,10 @@ def initialize_inventory():
     with open('data/inventory.json', 'w') as f:
         json.dump(inventory, f, indent=2)
     
+    # Discard any journal left over from the previous inventory
+    if os.path.exists('data/inventory.journal'):
+        os.remove('data/inventory.journal')
+    
     print(f"Initialized inventory with {len(inventory['opened']['sets'])} sets")
 
 if __name__ == '__main__':
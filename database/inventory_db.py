@@ -6,81 +6,38 @@ import os
 import json
 import sqlite3
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from database.connection import get_pool
+from database.migrations import SCHEMA_VERSION, migrate
+from database.set_resolver import get_set_resolver
+
+# Matches the predicate of the idx_slabs_incomplete partial index
+_SLAB_INCOMPLETE = 'psa_details_fetched = 0 OR front_image_path IS NULL OR back_image_path IS NULL'
 
 class InventoryDB:
     """SQLite database interface for inventory management"""
     
     def __init__(self, db_path: str = "data/inventory.db"):
-        """Initialize database connection"""
+        """Initialize database connection pool"""
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+        # Connections are shared per database file and handed out per thread
+        self.pool = get_pool(db_path)
         
-        # Initialize database tables
-        self._init_tables()
+        # Bring the schema up to date; once a pool has checked, later instances skip it
+        if self.pool.schema_version != SCHEMA_VERSION:
+            self.pool.schema_version = migrate(self.conn)
         
         # Load initial set data if database is empty
         if not self._has_sets():
             self._load_initial_sets()
     
-    def _init_tables(self):
-        """Initialize database tables"""
-        with self.conn:
-            # Sets table
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS sets (
-                    name TEXT PRIMARY KEY,
-                    code TEXT,
-                    series TEXT,
-                    packs_per_box INTEGER DEFAULT 36
-                )
-            ''')
-            
-            # Business boxes table (for inventory)
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS business_boxes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    set_name TEXT,
-                    purchase_date DATE,
-                    source TEXT,
-                    price REAL,
-                    packs_opened INTEGER DEFAULT 0,
-                    packs_sold INTEGER DEFAULT 0,
-                    FOREIGN KEY (set_name) REFERENCES sets (name)
-                )
-            ''')
-            
-            # Stashed boxes table (for personal collection)
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS stashed_boxes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    set_name TEXT,
-                    purchase_date DATE,
-                    source TEXT,
-                    price REAL,
-                    FOREIGN KEY (set_name) REFERENCES sets (name)
-                )
-            ''')
-            
-            # Slabs table (for PSA graded cards)
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS slabs (
-                    cert_number TEXT PRIMARY KEY,
-                    set_name TEXT,
-                    card_number TEXT,
-                    card_name TEXT,
-                    grade INTEGER,
-                    submission_date DATE,
-                    status TEXT,
-                    psa_details_fetched BOOLEAN DEFAULT 0,
-                    front_image_path TEXT,
-                    back_image_path TEXT,
-                    FOREIGN KEY (set_name) REFERENCES sets (name)
-                )
-            ''')
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection for the calling thread"""
+        return self.pool.connection()
     
     def _has_sets(self) -> bool:
         """Check if sets table has data"""
@@ -94,8 +51,8 @@ class InventoryDB:
                 
             with self.conn:
                 for series_name, series_data in data['series'].items():
-                    # Process main sets
-                    for set_info in series_data.get('main_sets', []):
+                    # Process main and special sets
+                    for set_info in series_data.get('main_sets', []) + series_data.get('special_sets', []):
                         self.conn.execute('''
                             INSERT OR REPLACE INTO sets (
                                 name, code, series
@@ -109,9 +66,8 @@ class InventoryDB:
             print(f"Error loading initial sets: {str(e)}")
     
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Return the calling thread's connection to the pool"""
+        self.pool.release()
     
     def get_sets_by_series(self, series: Optional[str] = None) -> List[Dict]:
         """Get all sets, optionally filtered by series"""
@@ -121,30 +77,25 @@ class InventoryDB:
                 s.code,
                 s.series,
                 s.packs_per_box,
-                COUNT(bb.id) as business_boxes,
-                COUNT(sb.id) as stashed_boxes,
-                SUM(CASE WHEN bb.id IS NOT NULL 
-                    THEN s.packs_per_box - bb.packs_opened - bb.packs_sold 
-                    ELSE 0 END) as available_packs,
-                SUM(CASE WHEN bb.id IS NOT NULL 
-                    THEN bb.packs_sold 
-                    ELSE 0 END) as packs_sold,
-                COUNT(sl.cert_number) as slab_count,
-                CASE WHEN bb.id IS NOT NULL 
-                    THEN ROUND(AVG(bb.price), 2)
+                COALESCE(t.business_boxes, 0) as business_boxes,
+                COALESCE(t.stashed_boxes, 0) as stashed_boxes,
+                COALESCE(s.packs_per_box * t.business_boxes
+                         - t.packs_opened - t.packs_sold, 0) as available_packs,
+                COALESCE(t.packs_sold, 0) as packs_sold,
+                COALESCE(t.slab_count, 0) as slab_count,
+                CASE WHEN t.business_priced_boxes > 0
+                    THEN ROUND(t.business_price_total / t.business_priced_boxes, 2)
                     ELSE NULL END as avg_box_price
             FROM sets s
-            LEFT JOIN business_boxes bb ON s.name = bb.set_name
-            LEFT JOIN stashed_boxes sb ON s.name = sb.set_name
-            LEFT JOIN slabs sl ON s.name = sl.set_name
+            LEFT JOIN set_totals t ON t.set_name = s.name
         '''
         
         if series:
             query += ' WHERE s.series = ?'
-            query += ' GROUP BY s.name ORDER BY s.name'
+            query += ' ORDER BY s.name'
             rows = self.conn.execute(query, (series,)).fetchall()
         else:
-            query += ' GROUP BY s.name ORDER BY s.name'
+            query += ' ORDER BY s.name'
             rows = self.conn.execute(query).fetchall()
             
         return [dict(row) for row in rows]
@@ -154,10 +105,151 @@ class InventoryDB:
         rows = self.conn.execute('SELECT DISTINCT series FROM sets ORDER BY series').fetchall()
         return [row[0] for row in rows]
     
-    def import_booster_purchases(self, file_path: str) -> Tuple[bool, List[str], List[str]]:
+    def get_slab_by_cert(self, cert_number: str) -> Optional[Dict]:
+        """Get a slab by its PSA cert number"""
+        row = self.conn.execute('SELECT * FROM slabs WHERE cert_number = ?', (str(cert_number),)).fetchone()
+        return dict(row) if row else None
+    
+    def get_slabs_by_certs(self, cert_numbers: List[str]) -> Dict[str, Dict]:
+        """Get slabs for many cert numbers, keyed by cert number; unknown certs are left out"""
+        certs = list(dict.fromkeys(str(cert) for cert in cert_numbers))
+        slabs = {}
+        for i in range(0, len(certs), 500):
+            chunk = certs[i:i + 500]
+            for row in self.conn.execute(
+                    f"SELECT * FROM slabs WHERE cert_number IN ({','.join('?' * len(chunk))})", chunk):
+                slabs[row['cert_number']] = dict(row)
+        return slabs
+    
+    def save_slab_details(self, details: Dict, cert_dir: str) -> bool:
+        """
+        Store PSA cert details on the slab, creating it if it was not imported
+        
+        details is a GetByCertNumber response (the PSACert object, wrapped or
+        not). Image paths are recorded for images already present in cert_dir.
+        Returns False if details has no cert number.
+        """
+        cert = details.get('PSACert', details)
+        cert_number = str(cert.get('CertNumber') or '').strip()
+        if not cert_number:
+            return False
+        
+        match = re.search(r'(\d+(?:\.\d)?)\s*$', str(cert.get('CardGrade') or ''))
+        grade = float(match.group(1)) if match else None
+        if grade is not None and grade.is_integer():
+            grade = int(grade)
+        
+        brand = cert.get('Brand')
+        set_name = (get_set_resolver().resolve(brand) or brand) if brand else None
+        image_paths = [
+            path if os.path.exists(path) else None
+            for path in (os.path.join(cert_dir, f'{cert_number}_{side}.jpg') for side in ('front', 'back'))
+        ]
+        
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO slabs (
+                    cert_number, set_name, card_number, card_name, grade,
+                    submission_date, status, psa_details_fetched,
+                    psa_pop_higher, psa_total_pop, psa_label_type,
+                    front_image_path, back_image_path
+                ) VALUES (?, ?, ?, ?, ?, date('now'), 'Submitted', 1, ?, ?, ?, ?, ?)
+                ON CONFLICT (cert_number) DO UPDATE SET
+                    card_number = COALESCE(slabs.card_number, excluded.card_number),
+                    card_name = COALESCE(slabs.card_name, excluded.card_name),
+                    grade = COALESCE(excluded.grade, slabs.grade),
+                    psa_details_fetched = 1,
+                    psa_pop_higher = COALESCE(excluded.psa_pop_higher, slabs.psa_pop_higher),
+                    psa_total_pop = COALESCE(excluded.psa_total_pop, slabs.psa_total_pop),
+                    psa_label_type = COALESCE(excluded.psa_label_type, slabs.psa_label_type),
+                    front_image_path = COALESCE(excluded.front_image_path, slabs.front_image_path),
+                    back_image_path = COALESCE(excluded.back_image_path, slabs.back_image_path)
+            ''', (
+                cert_number, set_name, cert.get('CardNumber'), cert.get('Subject'), grade,
+                cert.get('PopulationHigher'), cert.get('TotalPopulation'), cert.get('LabelType'),
+                *image_paths
+            ))
+        return True
+    
+    def save_slab_image(self, cert_number: str, side: str, image_path: str) -> bool:
+        """Record the downloaded front or back image of a slab"""
+        if side not in ('front', 'back'):
+            raise ValueError(f"Invalid image side: {side}")
+        with self.conn:
+            cursor = self.conn.execute(
+                f'UPDATE slabs SET {side}_image_path = ? WHERE cert_number = ?', (image_path, str(cert_number)))
+        return cursor.rowcount > 0
+    
+    def get_slab_stats(self) -> Dict[str, int]:
+        """Total, complete and incomplete slab counts in one query
+        
+        A slab is complete once its PSA details are stored and both images
+        are downloaded.
+        """
+        row = self.conn.execute(f'''
+            SELECT COUNT(*) AS total, TOTAL({_SLAB_INCOMPLETE}) AS incomplete FROM slabs
+        ''').fetchone()
+        incomplete = int(row['incomplete'])
+        return {"total": row['total'], "complete": row['total'] - incomplete, "incomplete": incomplete}
+    
+    def get_slab_status_counts(self) -> Dict[str, Dict[str, int]]:
+        """Slab counts per status, each split into complete and incomplete, in one query"""
+        rows = self.conn.execute(f'''
+            SELECT status, COUNT(*) AS total, TOTAL({_SLAB_INCOMPLETE}) AS incomplete
+            FROM slabs GROUP BY status
+        ''')
+        return {
+            row['status']: {"total": row['total'], "complete": row['total'] - int(row['incomplete']),
+                            "incomplete": int(row['incomplete'])}
+            for row in rows
+        }
+    
+    def get_slab_count(self) -> int:
+        """Get the number of slabs"""
+        return self.get_slab_stats()["total"]
+    
+    def get_complete_slab_count(self) -> int:
+        """Get the number of slabs with PSA details and both images"""
+        return self.get_slab_stats()["complete"]
+    
+    def get_incomplete_slab_count(self) -> int:
+        """Get the number of slabs still missing PSA details or images"""
+        return self.get_slab_stats()["incomplete"]
+    
+    def iter_pending_cert_numbers(self, batch_size: int = 500) -> Iterator[List[str]]:
+        """
+        Yield cert numbers of incomplete slabs in pages, ordered by cert number
+        
+        Pages are read by keyset (cert_number > last seen) through the
+        idx_slabs_incomplete partial index, so each page costs the same
+        however deep the iteration is, and slabs completed meanwhile are
+        simply not returned.
+        """
+        last = ''
+        while True:
+            page = [row[0] for row in self.conn.execute(f'''
+                SELECT cert_number FROM slabs
+                WHERE ({_SLAB_INCOMPLETE}) AND cert_number > ?
+                ORDER BY cert_number LIMIT ?
+            ''', (last, batch_size))]
+            if not page:
+                return
+            yield page
+            last = page[-1]
+    
+    def get_pending_cert_numbers(self, limit: Optional[int] = None) -> List[str]:
+        """Get cert numbers of slabs still missing PSA details or images"""
+        certs = []
+        for page in self.iter_pending_cert_numbers(min(limit, 500) if limit else 500):
+            certs.extend(page)
+            if limit and len(certs) >= limit:
+                return certs[:limit]
+        return certs
+    
+    def import_booster_purchases(self, file_path: str, delta: bool = True) -> Tuple[bool, List[str], List[str]]:
         """Import booster box purchases from CSV"""
         from database.booster_imports import import_booster_purchases
-        return import_booster_purchases(self, file_path)
+        return import_booster_purchases(self, file_path, delta=delta)
     
     def import_ebay_sales(self, file_path: str) -> bool:
         """Import eBay sales data from CSV"""
@@ -0,0 +1,148 @@
+"""
+Append-only journal and snapshot storage for the JSON inventory
+"""
+
+import os
+import json
+from typing import Dict, List, Optional, Tuple
+
+class InventoryJournal:
+    """Journal of inventory mutations backed by a periodic JSON snapshot
+
+    Each mutation is appended to the journal as one compact JSON line, so the
+    cost of a write depends on the size of the change rather than the size of
+    the inventory. The full inventory is only re-serialized when the journal is
+    compacted into the snapshot.
+
+    Several processes may share the same files. Callers must hold the
+    inventory file lock while reading or appending, and use is_current() to
+    detect records written or compactions made by other processes.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str, compact_every: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self.position = 0
+        self._file = None
+        self._inode = None
+
+    def load_snapshot(self) -> Optional[dict]:
+        """Load the last snapshot, if one exists"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                return json.load(f)
+        return None
+
+    def file_id(self) -> str:
+        """Identity of the snapshot or, before the first snapshot, the journal file"""
+        if os.path.exists(self.snapshot_path):
+            # Snapshots are replaced, never modified, so this changes with every snapshot
+            stat = os.stat(self.snapshot_path)
+            return f"{stat.st_ino:x}{stat.st_mtime_ns:x}"
+        return f"{os.stat(self.journal_path).st_ino:x}"
+
+    def read_records(self, after_seq: int) -> List[Dict]:
+        """Read journal records newer than the snapshot and open the journal for appending"""
+        self.close()
+        self.seq = after_seq
+        self.position = 0
+        self.records_since_snapshot = 0
+        self._file = open(self.journal_path, 'ab')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        return self.read_new_records()
+
+    def read_new_records(self) -> List[Dict]:
+        """Read records appended since the last read, e.g. by another process"""
+        records = []
+        good_offset = self.position
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self.position)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; drop it
+                    break
+                good_offset += len(line)
+                if record["seq"] > self.seq:
+                    records.append(record)
+                    self.seq = record["seq"]
+        if good_offset != os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        self.position = good_offset
+        self.records_since_snapshot += len(records)
+        return records
+
+    def is_current(self) -> bool:
+        """Whether this process has seen every record in the journal file"""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino == self._inode and stat.st_size == self.position
+
+    @property
+    def rotated(self) -> bool:
+        """Whether another process replaced the journal during compaction"""
+        try:
+            return os.stat(self.journal_path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def append(self, op: str, args: Dict, timestamp: str) -> int:
+        """Append a mutation record and return its sequence number"""
+        return self.append_many([(op, args, timestamp)])
+
+    def append_many(self, mutations: List[Tuple[str, Dict, str]]) -> int:
+        """Append several mutation records with a single write and fsync"""
+        seq = self.seq
+        lines = []
+        for op, args, timestamp in mutations:
+            seq += 1
+            lines.append(json.dumps({"seq": seq, "ts": timestamp, "op": op, "args": args},
+                                    separators=(',', ':')))
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.position += len(data)
+        self.seq = seq
+        self.records_since_snapshot += len(mutations)
+        return seq
+
+    @property
+    def needs_compaction(self) -> bool:
+        """Whether enough records have accumulated to warrant a new snapshot"""
+        return self.records_since_snapshot >= self.compact_every
+
+    def write_snapshot(self, payload: str):
+        """Atomically replace the snapshot with the serialized inventory"""
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def discard(self):
+        """Start an empty journal once every record is covered by the snapshot"""
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_path, self.journal_path)
+        self._file = open(self.journal_path, 'ab')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.position = 0
+        self.records_since_snapshot = 0
+
+    def close(self):
+        """Close the journal file"""
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -4,23 +4,63 @@ Inventory management system for Pokemon TCG products
 
 import os
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional, Union
+from database.inventory_journal import InventoryJournal
+from database.locking import FileLock, ReadWriteLock
 
 class InventoryManager:
-    def __init__(self, data_dir: str):
+    """JSON inventory shared by request threads and worker processes
+
+    Reads go through reading(), which first replays any journal records written
+    by other processes. Mutations hold the in-process write lock and the
+    inventory file lock, catch up with the journal, apply the change and append
+    it, so writers in different processes never overwrite each other.
+    """
+
+    # Journal operation name -> method that applies it to the in-memory inventory
+    OPERATIONS = {
+        "add_box": "_apply_add_box",
+        "add_case": "_apply_add_case",
+        "add_slab": "_apply_add_slab",
+        "update_slab_status": "_apply_update_slab_status",
+        "add_sequential_set": "_apply_add_sequential_set"
+    }
+
+    def __init__(self, data_dir: str, compact_every: int = 1000):
         """Initialize the inventory manager"""
         self.data_dir = data_dir
         self.inventory_path = os.path.join(data_dir, 'inventory.json')
+        self.journal_path = os.path.join(data_dir, 'inventory.journal')
         self.sets_path = os.path.join(data_dir, 'pokemon_sets.json')
-        self.inventory = self._load_inventory()
+        self._rwlock = ReadWriteLock()
+        self._file_lock = FileLock(os.path.join(data_dir, 'inventory.lock'))
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread = None
+        self._batch = None
+        self.journal = InventoryJournal(self.inventory_path, self.journal_path, compact_every)
         self.sets_data = self._load_sets_data()
+        self._set_index = self._build_set_index()
+        with self._file_lock:
+            self.inventory = self._load_inventory()
 
     def _load_inventory(self) -> dict:
-        """Load or create inventory file"""
-        if os.path.exists(self.inventory_path):
-            with open(self.inventory_path, 'r') as f:
-                return json.load(f)
+        """Load the inventory snapshot and replay the journal tail on top of it"""
+        self.inventory = self.journal.load_snapshot() or self._empty_inventory()
+        self._build_inventory_indexes()
+        snapshot_seq = self.inventory["metadata"].get("journal_seq", 0)
+        records = self.journal.read_records(snapshot_seq)
+        # Inventories created before generations existed are identified by their
+        # files, so every process derives the same one; compaction persists it
+        self.inventory["metadata"].setdefault("generation", self.journal.file_id())
+        for record in records:
+            self._replay(record)
+        return self.inventory
+
+    def _empty_inventory(self) -> dict:
+        """Create an empty inventory structure"""
         return {
             "metadata": {
                 "last_updated": datetime.now().isoformat(),
@@ -39,15 +79,208 @@ class InventoryManager:
         with open(self.sets_path, 'r') as f:
             return json.load(f)
 
+    def _build_set_index(self) -> Dict[str, Dict]:
+        """Index set info by set name"""
+        index = {}
+        for series in self.sets_data["series"].values():
+            for set_type in ["main_sets", "special_sets"]:
+                for set_info in series.get(set_type, []):
+                    index.setdefault(set_info["name"], set_info)
+        return index
+
+    def _build_inventory_indexes(self):
+        """Index slabs by cert number, cases by ID and track the highest box/case sequence per set"""
+        self._cert_index = {}
+        self._case_index = {}
+        self._box_seq = {}
+        self._case_seq = {}
+        self._totals = {
+            "opened": {"boxes": 0, "packs": 0, "slabs": 0},
+            "stashed": {"cases": 0, "boxes": 0}
+        }
+        self._active_sets = {"opened": set(), "stashed": set()}
+
+        for set_name, set_data in self.inventory["opened"]["sets"].items():
+            self._totals["opened"]["boxes"] += set_data["boxes"]["purchased"]
+            self._totals["opened"]["packs"] += set_data["packs"]["total"]
+            self._totals["opened"]["slabs"] += set_data.get("slabs", {}).get("total", 0)
+            self._track_active("opened", set_name)
+            for box in set_data["boxes"]["boxes"]:
+                self._track_box_id(set_name, box["id"])
+            for slab in set_data.get("slabs", {}).get("items", []):
+                self._cert_index.setdefault(slab["cert_number"], (set_name, slab))
+
+        for set_name, set_data in self.inventory["stashed"]["sets"].items():
+            self._totals["stashed"]["cases"] += set_data["cases"]["total"]
+            self._totals["stashed"]["boxes"] += set_data["total_boxes_stashed"]
+            self._track_active("stashed", set_name)
+            for box in set_data["loose_boxes"]["items"]:
+                self._track_box_id(set_name, box["id"])
+            for case in set_data["cases"]["items"]:
+                self._track_case(set_name, case)
+
+    def _track_active(self, section: str, set_name: str):
+        """Remember sets that hold any inventory so the dashboard can skip empty ones"""
+        set_data = self.inventory[section]["sets"][set_name]
+        if section == "opened":
+            active = (set_data["boxes"]["purchased"] or set_data["packs"]["total"]
+                      or set_data.get("slabs", {}).get("total", 0))
+        else:
+            active = set_data["cases"]["total"] or set_data["total_boxes_stashed"]
+        if active:
+            self._active_sets[section].add(set_name)
+
+    def _track_box_id(self, set_name: str, box_id: str):
+        """Record a box ID in the per-set box sequence counter"""
+        seq = int(box_id.rsplit("-", 1)[1])
+        if seq > self._box_seq.get(set_name, 0):
+            self._box_seq[set_name] = seq
+
+    def _track_case(self, set_name: str, case: Dict):
+        """Record a case in the case index and per-set case sequence counter"""
+        self._case_index[case["id"]] = (set_name, case)
+        seq = int(case["id"].split("-C")[1])
+        if seq > self._case_seq.get(set_name, 0):
+            self._case_seq[set_name] = seq
+
+    def _replay(self, record: Dict):
+        """Re-apply a journal record to the in-memory inventory"""
+        getattr(self, self.OPERATIONS[record["op"]])(**record["args"])
+        self.inventory["metadata"]["last_updated"] = record["ts"]
+        self.inventory["metadata"]["journal_seq"] = record["seq"]
+
+    @property
+    def version(self) -> int:
+        """Sequence number of the last mutation applied to the inventory"""
+        return self.inventory["metadata"].get("journal_seq", 0)
+
+    @property
+    def generation(self) -> str:
+        """Identifier of this inventory, new whenever it is re-initialized
+
+        Sequence numbers start over with a new inventory, so a version is
+        only meaningful together with its generation.
+        """
+        return self.inventory["metadata"]["generation"]
+
+    def get_dashboard(self) -> Dict:
+        """Get running totals and the sets that hold inventory; caller holds reading()"""
+        return {
+            "opened_totals": dict(self._totals["opened"]),
+            "stashed_totals": dict(self._totals["stashed"]),
+            "opened_sets": {name: self.inventory["opened"]["sets"][name]
+                            for name in sorted(self._active_sets["opened"])},
+            "stashed_sets": {name: self.inventory["stashed"]["sets"][name]
+                             for name in sorted(self._active_sets["stashed"])}
+        }
+
+    @property
+    def set_names(self) -> List[str]:
+        """Names of all sets in the sets database"""
+        return list(self._set_index)
+
+    @contextmanager
+    def reading(self):
+        """Hold a shared lock on an up-to-date view of the inventory"""
+        if not self.journal.is_current():
+            with self._rwlock.write(), self._file_lock:
+                self._catch_up()
+        with self._rwlock.read():
+            yield self.inventory
+
+    def _catch_up(self):
+        """Apply changes made by other processes; caller holds both locks"""
+        if self.journal.is_current():
+            return
+        if self.journal.rotated:
+            # Another process compacted the journal into a new snapshot
+            self._load_inventory()
+        else:
+            for record in self.journal.read_new_records():
+                self._replay(record)
+
+    def _mutate(self, op: str, **args):
+        """Apply a mutation and append it to the journal"""
+        with self._rwlock.write(), self._file_lock:
+            self._catch_up()
+            result = getattr(self, self.OPERATIONS[op])(**args)
+            mutation = (op, args, datetime.now().isoformat())
+            if self._batch is not None:
+                self._batch.append(mutation)
+            else:
+                self._persist([mutation])
+        return result
+
+    def _persist(self, mutations: List[tuple]):
+        """Append applied mutations to the journal; caller holds both locks"""
+        if not mutations:
+            return
+        seq = self.journal.append_many(mutations)
+        self.inventory["metadata"]["last_updated"] = mutations[-1][2]
+        self.inventory["metadata"]["journal_seq"] = seq
+        if self.journal.needs_compaction:
+            self._start_compaction()
+
+    @contextmanager
+    def batch(self):
+        """Apply many mutations while holding the locks and persist them with one write
+
+        Mutations applied before an exception inside the block are still
+        persisted, since they have already changed the in-memory inventory.
+        """
+        with self._rwlock.write(), self._file_lock:
+            if self._batch is not None:
+                # Nested batches join the outer one
+                yield self
+                return
+            self._catch_up()
+            self._batch = []
+            try:
+                yield self
+            finally:
+                mutations, self._batch = self._batch, None
+                self._persist(mutations)
+
+    def _start_compaction(self):
+        """Compact the journal into a new snapshot on a background thread"""
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._save_inventory, daemon=True)
+        self._compaction_thread.start()
+
     def _save_inventory(self):
-        """Save inventory to file"""
-        self.inventory["metadata"]["last_updated"] = datetime.now().isoformat()
-        with open(self.inventory_path, 'w') as f:
-            json.dump(self.inventory, f, indent=2)
+        """Write a full snapshot and drop the journal records it covers"""
+        with self._compaction_lock:
+            with self._rwlock.write():
+                self._file_lock.acquire()
+                try:
+                    self._catch_up()
+                    payload = json.dumps(self.inventory, indent=2)
+                except Exception:
+                    self._file_lock.release()
+                    raise
+            # Only the file lock is kept while writing. Other writers block on
+            # it while holding the write lock, so readers in this process keep
+            # going only until a writer arrives
+            try:
+                self.journal.write_snapshot(payload)
+                self.journal.discard()
+            finally:
+                self._file_lock.release()
+
+    def checkpoint(self):
+        """Synchronously compact the journal into the snapshot"""
+        self._save_inventory()
 
     def add_box(self, set_name: str, purchase_date: str, source: str, 
                 price: float, is_stashed: bool = False, case_id: Optional[str] = None) -> str:
         """Add a new box to inventory"""
+        return self._mutate("add_box", set_name=set_name, purchase_date=purchase_date,
+                            source=source, price=price, is_stashed=is_stashed, case_id=case_id)
+
+    def _apply_add_box(self, set_name: str, purchase_date: str, source: str,
+                       price: float, is_stashed: bool = False, case_id: Optional[str] = None) -> str:
+        """Add a box to the in-memory inventory"""
         # Verify set exists
         if not self._verify_set_exists(set_name):
             raise ValueError(f"Set {set_name} not found in sets database")
@@ -64,12 +297,17 @@ class InventoryManager:
         else:
             self._add_opened_box(set_name, box_id, purchase_date, source, price)
 
-        self._save_inventory()
         return box_id
 
     def add_case(self, set_name: str, purchase_date: str, source: str, 
                  price_per_box: float) -> str:
         """Add a new sealed case to inventory"""
+        return self._mutate("add_case", set_name=set_name, purchase_date=purchase_date,
+                            source=source, price_per_box=price_per_box)
+
+    def _apply_add_case(self, set_name: str, purchase_date: str, source: str,
+                        price_per_box: float) -> str:
+        """Add a sealed case to the in-memory inventory"""
         if not self._verify_set_exists(set_name):
             raise ValueError(f"Set {set_name} not found in sets database")
 
@@ -85,21 +323,31 @@ class InventoryManager:
                 "total_boxes_stashed": 0
             }
 
-        self.inventory["stashed"]["sets"][set_name]["cases"]["items"].append({
+        case = {
             "id": case_id,
             "purchase_date": purchase_date,
             "source": source,
             "price_per_box": price_per_box
-        })
+        }
+        self.inventory["stashed"]["sets"][set_name]["cases"]["items"].append(case)
+        self._track_case(set_name, case)
         self.inventory["stashed"]["sets"][set_name]["cases"]["total"] += 1
         self.inventory["stashed"]["sets"][set_name]["total_boxes_stashed"] += self._get_boxes_per_case(set_name)
+        self._totals["stashed"]["cases"] += 1
+        self._totals["stashed"]["boxes"] += self._get_boxes_per_case(set_name)
+        self._active_sets["stashed"].add(set_name)
 
-        self._save_inventory()
         return case_id
 
     def add_slab(self, cert_number: str, set_name: str, status: str = "imported",
                  cert_details: Optional[Dict] = None):
         """Add a graded card slab to inventory"""
+        self._mutate("add_slab", cert_number=cert_number, set_name=set_name,
+                     status=status, cert_details=cert_details)
+
+    def _apply_add_slab(self, cert_number: str, set_name: str, status: str = "imported",
+                        cert_details: Optional[Dict] = None):
+        """Add a slab to the in-memory inventory"""
         if status not in ["imported", "ready_to_list", "listed", "stashed"]:
             raise ValueError("Invalid slab status")
 
@@ -115,34 +363,49 @@ class InventoryManager:
             }
 
         # Add slab
-        set_data["slabs"]["items"].append({
+        slab = {
             "cert_number": cert_number,
             "status": status,
             "details": cert_details
-        })
+        }
+        set_data["slabs"]["items"].append(slab)
+        self._cert_index.setdefault(cert_number, (set_name, slab))
         set_data["slabs"]["total"] += 1
         set_data["slabs"]["status"][status] += 1
-
-        self._save_inventory()
+        self._totals["opened"]["slabs"] += 1
+        self._active_sets["opened"].add(set_name)
 
     def update_slab_status(self, cert_number: str, new_status: str):
         """Update the status of a slab"""
-        for set_data in self.inventory["opened"]["sets"].values():
-            if "slabs" not in set_data:
-                continue
-            
-            for slab in set_data["slabs"]["items"]:
-                if slab["cert_number"] == cert_number:
-                    old_status = slab["status"]
-                    slab["status"] = new_status
-                    set_data["slabs"]["status"][old_status] -= 1
-                    set_data["slabs"]["status"][new_status] += 1
-                    self._save_inventory()
-                    return True
-        return False
+        with self._rwlock.write(), self._file_lock:
+            self._catch_up()
+            if cert_number not in self._cert_index:
+                return False
+            return self._mutate("update_slab_status", cert_number=cert_number, new_status=new_status)
+
+    def _apply_update_slab_status(self, cert_number: str, new_status: str) -> bool:
+        """Update a slab status in the in-memory inventory"""
+        if cert_number not in self._cert_index:
+            return False
+
+        set_name, slab = self._cert_index[cert_number]
+        set_data = self.inventory["opened"]["sets"][set_name]
+        if new_status not in set_data["slabs"]["status"]:
+            raise ValueError("Invalid slab status")
+
+        old_status = slab["status"]
+        slab["status"] = new_status
+        set_data["slabs"]["status"][old_status] -= 1
+        set_data["slabs"]["status"][new_status] += 1
+        return True
 
     def add_sequential_set(self, type_: str, identifier: str, cert_numbers: List[str]):
         """Add a sequential set of slabs"""
+        self._mutate("add_sequential_set", type_=type_, identifier=identifier,
+                     cert_numbers=list(cert_numbers))
+
+    def _apply_add_sequential_set(self, type_: str, identifier: str, cert_numbers: List[str]):
+        """Add a sequential set to the in-memory inventory"""
         if type_ not in ["pokemon", "set_based"]:
             raise ValueError("Invalid sequential set type")
 
@@ -180,26 +443,14 @@ class InventoryManager:
             target["sequences"].append(current_sequence)
             target["total"] += len(cert_numbers)
 
-        self._save_inventory()
-
     def _verify_set_exists(self, set_name: str) -> bool:
         """Verify a set exists in the sets database"""
-        for series in self.sets_data["series"].values():
-            for set_type in ["main_sets", "special_sets"]:
-                if set_type in series:
-                    if any(s["name"] == set_name for s in series[set_type]):
-                        return True
-        return False
+        return set_name in self._set_index
 
     def _get_set_code(self, set_name: str) -> str:
         """Get the set code for a given set name"""
-        for series in self.sets_data["series"].values():
-            for set_type in ["main_sets", "special_sets"]:
-                if set_type in series:
-                    for set_info in series[set_type]:
-                        if set_info["name"] == set_name:
-                            return set_info["code"]
-        return "UNK"
+        set_info = self._set_index.get(set_name)
+        return set_info["code"] if set_info else "UNK"
 
     def _get_boxes_per_case(self, set_name: str) -> int:
         """Get the number of boxes per case for a set"""
@@ -214,19 +465,8 @@ class InventoryManager:
     def _generate_next_id(self, set_name: str, type_: str) -> int:
         """Generate the next available ID for a box or case"""
         if type_ == "box":
-            existing = []
-            if set_name in self.inventory["opened"]["sets"]:
-                existing.extend(b["id"].split("-")[1] for b in self.inventory["opened"]["sets"][set_name]["boxes"]["boxes"])
-            if set_name in self.inventory["stashed"]["sets"]:
-                existing.extend(b["id"].split("-")[1] for b in self.inventory["stashed"]["sets"][set_name]["loose_boxes"]["items"])
-        else:  # case
-            if set_name not in self.inventory["stashed"]["sets"]:
-                return 1
-            existing = [c["id"].split("-C")[1] for c in self.inventory["stashed"]["sets"][set_name]["cases"]["items"]]
-        
-        if not existing:
-            return 1
-        return max(int(i) for i in existing) + 1
+            return self._box_seq.get(set_name, 0) + 1
+        return self._case_seq.get(set_name, 0) + 1
 
     def _initialize_set(self, set_name: str):
         """Initialize a new set in the opened inventory"""
@@ -259,6 +499,9 @@ class InventoryManager:
             "packs_sold": 0
         })
         self.inventory["opened"]["sets"][set_name]["boxes"]["purchased"] += 1
+        self._totals["opened"]["boxes"] += 1
+        self._active_sets["opened"].add(set_name)
+        self._track_box_id(set_name, box_id)
 
     def _add_loose_box(self, set_name: str, box_id: str, purchase_date: str, source: str, price: float):
         """Add a loose box to stashed inventory"""
@@ -279,19 +522,17 @@ class InventoryManager:
         })
         self.inventory["stashed"]["sets"][set_name]["loose_boxes"]["total"] += 1
         self.inventory["stashed"]["sets"][set_name]["total_boxes_stashed"] += 1
+        self._totals["stashed"]["boxes"] += 1
+        self._active_sets["stashed"].add(set_name)
+        self._track_box_id(set_name, box_id)
 
     def _add_to_case(self, set_name: str, box_id: str, case_id: str, purchase_date: str, source: str, price: float):
         """Add a box to an existing case"""
         if set_name not in self.inventory["stashed"]["sets"]:
             raise ValueError(f"No cases found for set {set_name}")
 
-        case = None
-        for c in self.inventory["stashed"]["sets"][set_name]["cases"]["items"]:
-            if c["id"] == case_id:
-                case = c
-                break
-
-        if not case:
+        case_set, case = self._case_index.get(case_id, (None, None))
+        if case_set != set_name:
             raise ValueError(f"Case {case_id} not found")
 
         if "boxes" not in case:
@@ -0,0 +1,420 @@
+"""
+Versioned schema migrations for the inventory database
+
+The schema version is stored in SQLite's PRAGMA user_version. Each entry in
+MIGRATIONS upgrades the schema by one version; migrate() applies the ones a
+database has not seen yet, so a database that is already current costs a
+single PRAGMA read and no DDL. To change the schema, append a migration —
+never edit one that has shipped.
+"""
+
+import logging
+import sqlite3
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+    """Add any of columns (name -> declaration) the table is missing"""
+    existing = _columns(conn, table)
+    for name, declaration in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {declaration}')
+
+def _baseline(conn: sqlite3.Connection):
+    """Tables previously created by InventoryDB, init_db.py and update_schema.py
+
+    Databases created before versioning already have some of these tables,
+    possibly from either of the old scripts, so tables are created only if
+    missing and columns one layout lacks are added.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sets (
+            name TEXT PRIMARY KEY,
+            code TEXT,
+            series TEXT,
+            packs_per_box INTEGER DEFAULT 36
+        )
+    ''')
+
+    # Business boxes (for inventory)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS business_boxes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            set_name TEXT,
+            purchase_date DATE,
+            source TEXT,
+            price REAL,
+            packs_opened INTEGER DEFAULT 0,
+            packs_sold INTEGER DEFAULT 0,
+            FOREIGN KEY (set_name) REFERENCES sets (name)
+        )
+    ''')
+
+    # Stashed boxes (for personal collection)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stashed_boxes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            set_name TEXT,
+            purchase_date DATE,
+            source TEXT,
+            price REAL,
+            FOREIGN KEY (set_name) REFERENCES sets (name)
+        )
+    ''')
+
+    # Slabs (PSA graded cards), with the PSA and sale columns init_db.py had
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slabs (
+            cert_number TEXT PRIMARY KEY,
+            set_name TEXT,
+            card_number TEXT,
+            card_name TEXT,
+            grade INTEGER,
+            submission_date DATE,
+            return_date DATE,
+            status TEXT,
+            psa_details_fetched BOOLEAN DEFAULT 0,
+            psa_pop_higher INTEGER,
+            psa_total_pop INTEGER,
+            psa_label_type TEXT,
+            front_image_path TEXT,
+            back_image_path TEXT,
+            sale_price DECIMAL,
+            shipping_charged DECIMAL,
+            shipping_cost DECIMAL,
+            ebay_fees DECIMAL,
+            sale_date DATE,
+            FOREIGN KEY (set_name) REFERENCES sets (name)
+        )
+    ''')
+    _add_columns(conn, 'slabs', {
+        'return_date': 'DATE',
+        'psa_details_fetched': 'BOOLEAN DEFAULT 0',
+        'psa_pop_higher': 'INTEGER',
+        'psa_total_pop': 'INTEGER',
+        'psa_label_type': 'TEXT',
+        'front_image_path': 'TEXT',
+        'back_image_path': 'TEXT',
+        'sale_price': 'DECIMAL',
+        'shipping_charged': 'DECIMAL',
+        'shipping_cost': 'DECIMAL',
+        'ebay_fees': 'DECIMAL',
+        'sale_date': 'DATE'
+    })
+
+    # Pack sales (eBay sales)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pack_sales (
+            id INTEGER PRIMARY KEY,
+            set_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            sale_price DECIMAL NOT NULL,
+            shipping_charged DECIMAL NOT NULL,
+            shipping_cost DECIMAL NOT NULL,
+            ebay_fees DECIMAL NOT NULL,
+            sale_date DATE NOT NULL,
+            row_key TEXT,
+            FOREIGN KEY (set_name) REFERENCES sets (name)
+        )
+    ''')
+    # Existing rows get their keys from ebay_imports.backfill_sale_keys()
+    _add_columns(conn, 'pack_sales', {
+        'ebay_fees': 'DECIMAL NOT NULL DEFAULT 0',
+        'row_key': 'TEXT'
+    })
+
+    # Per-set sales metrics maintained by database.sales_analytics
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sales_summary (
+            set_name TEXT PRIMARY KEY,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            item_sales REAL NOT NULL,
+            shipping_charged REAL NOT NULL,
+            shipping_cost REAL NOT NULL,
+            ebay_fees REAL NOT NULL,
+            low_price REAL,
+            high_price REAL,
+            p25_price REAL,
+            median_price REAL,
+            p75_price REAL,
+            refunded_orders INTEGER NOT NULL,
+            refund_shipping_cost REAL NOT NULL,
+            first_sale DATE,
+            last_sale DATE,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # How far each sales export source has been imported
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_watermarks (
+            source TEXT PRIMARY KEY,
+            file_hash TEXT,
+            last_sale_date DATE,
+            rows_imported INTEGER NOT NULL DEFAULT 0,
+            imported_at TIMESTAMP
+        )
+    ''')
+
+    # Purchase rows already imported, keyed by order ID or content hash
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS booster_purchases (
+            row_key TEXT PRIMARY KEY,
+            set_name TEXT,
+            purchase_date DATE,
+            source TEXT,
+            price REAL,
+            business_boxes INTEGER,
+            stashed_boxes INTEGER,
+            imported_at TIMESTAMP,
+            FOREIGN KEY (set_name) REFERENCES sets (name)
+        )
+    ''')
+
+    # Durable queue of PSA work, drained as the daily API quota allows
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS psa_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cert_number TEXT NOT NULL,
+            task TEXT NOT NULL DEFAULT 'cert',
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            last_error TEXT,
+            not_before TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (cert_number, task)
+        )
+    ''')
+
+    # Per-cert progress through the PSA pipeline, so reruns only redo missing stages
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS psa_cert_stages (
+            cert_number TEXT PRIMARY KEY,
+            details_json TEXT,
+            details_fetched_at TIMESTAMP,
+            image_urls_json TEXT,
+            image_urls_fetched_at TIMESTAMP,
+            front_path TEXT,
+            front_downloaded_at TIMESTAMP,
+            back_path TEXT,
+            back_downloaded_at TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Daily PSA API call counters shared by every processor
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS psa_api_usage (
+            id INTEGER PRIMARY KEY,
+            date DATE UNIQUE NOT NULL,
+            calls_made INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Per-call log, pruned after a retention period
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS psa_api_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE NOT NULL,
+            cert_number TEXT,
+            called_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _totals_triggers(conn: sqlite3.Connection, table: str, columns: str, add: str, remove: str):
+    """Create the triggers that keep set_totals in step with one child table
+
+    add and remove are SET clauses applied for a new row and reverted for an
+    old one, with {row} standing for NEW or OLD.
+    """
+    add_new = f'''
+        INSERT OR IGNORE INTO set_totals (set_name) VALUES (NEW.set_name);
+        UPDATE set_totals SET {add.format(row='NEW')} WHERE set_name = NEW.set_name;
+    '''
+    remove_old = f'''
+        UPDATE set_totals SET {remove.format(row='OLD')} WHERE set_name = OLD.set_name;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_insert
+        AFTER INSERT ON {table} BEGIN {add_new} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_delete
+        AFTER DELETE ON {table} BEGIN {remove_old} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_update
+        AFTER UPDATE OF {columns} ON {table} BEGIN {remove_old} {add_new} END
+    ''')
+
+def _set_totals(conn: sqlite3.Connection):
+    """Create the per-set aggregate table and the triggers that maintain it
+
+    Each child table is aggregated into its own columns of set_totals as
+    rows change, so reading per-set figures never joins the child tables.
+    """
+    exists = conn.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'set_totals'
+    ''').fetchone()
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS set_totals (
+            set_name TEXT PRIMARY KEY,
+            business_boxes INTEGER NOT NULL DEFAULT 0,
+            business_price_total REAL NOT NULL DEFAULT 0,
+            packs_opened INTEGER NOT NULL DEFAULT 0,
+            packs_sold INTEGER NOT NULL DEFAULT 0,
+            stashed_boxes INTEGER NOT NULL DEFAULT 0,
+            slab_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # (table, aggregated columns, SET clause applied for a row, SET clause reverted for a row)
+    aggregates = [
+        ('business_boxes', 'set_name, price, packs_opened, packs_sold',
+         '''business_boxes = business_boxes + 1,
+            business_price_total = business_price_total + COALESCE({row}.price, 0),
+            packs_opened = packs_opened + COALESCE({row}.packs_opened, 0),
+            packs_sold = packs_sold + COALESCE({row}.packs_sold, 0)''',
+         '''business_boxes = business_boxes - 1,
+            business_price_total = business_price_total - COALESCE({row}.price, 0),
+            packs_opened = packs_opened - COALESCE({row}.packs_opened, 0),
+            packs_sold = packs_sold - COALESCE({row}.packs_sold, 0)'''),
+        ('stashed_boxes', 'set_name',
+         'stashed_boxes = stashed_boxes + 1', 'stashed_boxes = stashed_boxes - 1'),
+        ('slabs', 'set_name',
+         'slab_count = slab_count + 1', 'slab_count = slab_count - 1')
+    ]
+    for aggregate in aggregates:
+        _totals_triggers(conn, *aggregate)
+
+    if not exists:
+        # Backfill from rows that predate the aggregate table
+        conn.execute('''
+            INSERT INTO set_totals (
+                set_name, business_boxes, business_price_total,
+                packs_opened, packs_sold, stashed_boxes, slab_count
+            )
+            SELECT set_name, SUM(business_boxes), SUM(business_price_total),
+                   SUM(packs_opened), SUM(packs_sold), SUM(stashed_boxes), SUM(slab_count)
+            FROM (
+                SELECT set_name, COUNT(*) AS business_boxes,
+                       COALESCE(SUM(price), 0) AS business_price_total,
+                       COALESCE(SUM(packs_opened), 0) AS packs_opened,
+                       COALESCE(SUM(packs_sold), 0) AS packs_sold,
+                       0 AS stashed_boxes, 0 AS slab_count
+                FROM business_boxes GROUP BY set_name
+                UNION ALL
+                SELECT set_name, 0, 0, 0, 0, COUNT(*), 0
+                FROM stashed_boxes GROUP BY set_name
+                UNION ALL
+                SELECT set_name, 0, 0, 0, 0, 0, COUNT(*)
+                FROM slabs GROUP BY set_name
+            )
+            WHERE set_name IS NOT NULL
+            GROUP BY set_name
+        ''')
+
+def _indexes(conn: sqlite3.Connection):
+    """Secondary indexes for per-set lookups, slab filters, the PSA queue and sales"""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sets_series ON sets (series)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_business_boxes_set ON business_boxes (set_name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stashed_boxes_set ON stashed_boxes (set_name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slabs_set ON slabs (set_name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slabs_status ON slabs (status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_psa_jobs_claim ON psa_jobs (status, priority DESC, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_psa_api_calls_date ON psa_api_calls (date)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_pack_sales_row_key ON pack_sales (row_key)')
+    # Covers every column the per-set sales aggregates read
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pack_sales_set ON pack_sales (
+            set_name, sale_price, quantity, shipping_charged, shipping_cost, ebay_fees, sale_date
+        )
+    ''')
+
+def _slab_indexes(conn: sqlite3.Connection):
+    """Indexes for the InventoryDB slab queries
+
+    cert_number lookups use the table's primary key or unique index, and
+    status filters use idx_slabs_status. The partial index holds only slabs
+    still missing PSA details (psa_details_fetched = 0) or images, so keyset
+    paging through pending certs never touches finished slabs.
+    """
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_slabs_incomplete ON slabs (cert_number)
+        WHERE psa_details_fetched = 0 OR front_image_path IS NULL OR back_image_path IS NULL
+    ''')
+
+def _priced_boxes(conn: sqlite3.Connection):
+    """Count business boxes with a price, so boxes without one don't lower the average"""
+    _add_columns(conn, 'set_totals', {'business_priced_boxes': 'INTEGER NOT NULL DEFAULT 0'})
+    for event in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS trg_business_boxes_totals_{event}')
+    _totals_triggers(
+        conn, 'business_boxes', 'set_name, price, packs_opened, packs_sold',
+        '''business_boxes = business_boxes + 1,
+           business_priced_boxes = business_priced_boxes + ({row}.price IS NOT NULL),
+           business_price_total = business_price_total + COALESCE({row}.price, 0),
+           packs_opened = packs_opened + COALESCE({row}.packs_opened, 0),
+           packs_sold = packs_sold + COALESCE({row}.packs_sold, 0)''',
+        '''business_boxes = business_boxes - 1,
+           business_priced_boxes = business_priced_boxes - ({row}.price IS NOT NULL),
+           business_price_total = business_price_total - COALESCE({row}.price, 0),
+           packs_opened = packs_opened - COALESCE({row}.packs_opened, 0),
+           packs_sold = packs_sold - COALESCE({row}.packs_sold, 0)''')
+    conn.execute('''
+        UPDATE set_totals SET business_priced_boxes = (
+            SELECT COUNT(price) FROM business_boxes b WHERE b.set_name = set_totals.set_name
+        )
+    ''')
+
+# (version, description, migration); versions are consecutive from 1
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline tables", _baseline),
+    (2, "per-set totals and triggers", _set_totals),
+    (3, "secondary indexes", _indexes),
+    (4, "slab query indexes", _slab_indexes),
+    (5, "priced business box counts", _priced_boxes)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations and return the resulting schema version
+
+    Migrations run in one IMMEDIATE transaction, and the version is re-read
+    once the write lock is held, so processes starting together apply each
+    migration exactly once. A failing migration rolls back the whole upgrade.
+    """
+    version = get_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = get_version(conn)
+        for target, description, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info("Applying schema migration %d: %s", target, description)
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target}')
+            version = target
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return version
@@ -2,81 +2,77 @@
 Import handler for PSA submissions
 """
 
-import os
+from typing import List
 from database.inventory_db import InventoryDB
+from database.set_resolver import get_set_resolver
+from database.csv_ingest import Column, Schema, Record, ingest, parse_grade
 
-def import_psa_submissions(db: InventoryDB, file_path: str) -> bool:
+PSA_SUBMISSION_SCHEMA = Schema([
+    Column("PSA SUBMISSION NUMBER", aliases=["cert_number", "cert number"]),
+    Column("SET"),
+    Column("CARD NUMBER"),
+    Column("CARD NAME"),
+    Column("GRADE", parse_grade)
+], positional=["YEAR", "SET", "CARD NUMBER", "CARD NAME", "-", "GRADE", "PSA SUBMISSION NUMBER"])
+
+def import_psa_submissions(db: InventoryDB, file_path: str, batch_size: int = 5000) -> bool:
     """
-    Import PSA submissions from CSV file and create initial folders
+    Import PSA submissions from CSV file
     
     Expected format:
     YEAR,SET,CARD NUMBER,CARD NAME,-,GRADE,PSA SUBMISSION NUMBER
     2025,POKEMON JAPANESE SV9-BATTLE PARTNERS,123,BROCK'S SCOUTING SUPER RARE,-,PSA 10,110975567
     
+    Columns are located by header name, so exports with extra columns
+    (e.g. CARD TYPE) import too. The file is read with PSA_SUBMISSION_SCHEMA
+    and new slabs are inserted with executemany in a single transaction;
+    certs already in the database are left untouched. Slab folders are not
+    created here; the PSA processor creates them when images are downloaded.
+    
     Returns:
     - success: bool
     """
     try:
-        # Ensure PSA slab info directory exists
-        psa_data_dir = os.path.join(os.path.dirname(db.db_path), 'psa_slab_info')
-        os.makedirs(psa_data_dir, exist_ok=True)
-        
+        resolver = get_set_resolver()
         imported_count = 0
-        with open(file_path, 'r') as f:
-            # Skip header row
-            next(f)
+        unmatched_sets = set()
+        
+        def write_batch(records: List[Record]):
+            nonlocal imported_count
+            rows = []
+            for record in records:
+                cert_number, raw_set_name, card_number, card_name, grade = record.values
+                set_name = resolver.resolve(raw_set_name)
+                if not set_name:
+                    if raw_set_name not in unmatched_sets:
+                        print(f"Set not found: {raw_set_name}")
+                        unmatched_sets.add(raw_set_name)
+                    set_name = raw_set_name
+                rows.append((cert_number, set_name, card_number, card_name, grade))
             
-            # Process each row
-            for line in f:
-                # Split on comma and strip quotes
-                parts = [p.strip().strip("'") for p in line.strip().split(',')]
-                
-                if len(parts) < 7:
-                    continue
-                    
-                # Extract data
-                year = parts[0]
-                set_name = parts[1]
-                card_number = parts[2]
-                card_name = parts[3]
-                grade = int(parts[5].replace('PSA ', ''))
-                cert_number = parts[6]
-                
-                # Create slab directory
-                slab_dir = os.path.join(psa_data_dir, cert_number)
-                os.makedirs(slab_dir, exist_ok=True)
-                
-                # Insert into slabs table
-                with db.conn:
-                    # Check if slab already exists
-                    existing = db.conn.execute('''
-                        SELECT 1 FROM slabs WHERE cert_number = ?
-                    ''', (cert_number,)).fetchone()
-                    
-                    if not existing:
-                        db.conn.execute('''
-                            INSERT INTO slabs (
-                                cert_number,
-                                set_name,
-                                card_number,
-                                card_name,
-                                grade,
-                                submission_date,
-                                status,
-                                psa_details_fetched
-                            ) VALUES (?, ?, ?, ?, ?, date('now'), 'Submitted', 0)
-                        ''', (
-                            cert_number,
-                            set_name,
-                            card_number,
-                            card_name,
-                            grade
-                        ))
-                        imported_count += 1
+            cursor = db.conn.executemany('''
+                INSERT INTO slabs (
+                    cert_number,
+                    set_name,
+                    card_number,
+                    card_name,
+                    grade,
+                    submission_date,
+                    status,
+                    psa_details_fetched
+                ) VALUES (?, ?, ?, ?, ?, date('now'), 'Submitted', 0)
+                ON CONFLICT (cert_number) DO NOTHING
+            ''', rows)
+            imported_count += max(cursor.rowcount, 0)
         
-        print(f"Imported {imported_count} new PSA submissions")
-        return True
+        with db.conn:
+            report = ingest(file_path, PSA_SUBMISSION_SCHEMA, write_batch, batch_size)
         
+        for error in report.errors:
+            print(f"Skipped {error}")
+        print(f"Imported {imported_count} new PSA submissions ({report.summary()})")
+        return True
+    
     except Exception as e:
         print(f"Error importing PSA submissions: {str(e)}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,351 @@
+"""
+Per-set sales analytics computed from the pack_sales table
+"""
+
+import csv
+import os
+import shutil
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Sequence
+from database.inventory_db import InventoryDB
+
+try:
+    import numpy as np
+except ImportError:  # optional; pure Python fallbacks are used without it
+    np = None
+
+REPORT_COLUMNS = [
+    "Set Name", "Orders", "Units", "Item Sales", "Shipping Charged", "Shipping Cost",
+    "eBay Fees", "Total Revenue", "Net Revenue", "Profit/Unit", "Shipping Profit",
+    "Low Price", "High Price", "Refunded Orders"
+]
+
+LISTING_COLUMNS = [
+    "Title", "Quantity", "Item Sales", "Shipping Charged", "Shipping Cost",
+    "eBay Fees", "Total Revenue", "Net Revenue"
+]
+
+PERCENTILES = (25, 50, 75)
+
+# Written at the end of every report; a file without it came from elsewhere
+GENERATED_LABEL = "Generated by database.sales_analytics"
+
+# Rows with no item price are refunded or cancelled orders; their shipping cost is a loss
+_AGGREGATE_SQL = '''
+    SELECT set_name,
+           SUM(sale_price > 0) AS orders,
+           TOTAL(CASE WHEN sale_price > 0 THEN quantity END) AS units,
+           TOTAL(CASE WHEN sale_price > 0 THEN sale_price END) AS item_sales,
+           TOTAL(CASE WHEN sale_price > 0 THEN shipping_charged END) AS shipping_charged,
+           TOTAL(CASE WHEN sale_price > 0 THEN shipping_cost END) AS shipping_cost,
+           TOTAL(CASE WHEN sale_price > 0 THEN ebay_fees END) AS ebay_fees,
+           MIN(CASE WHEN sale_price > 0 AND quantity > 0 THEN CAST(sale_price AS REAL) / quantity END) AS low_price,
+           MAX(CASE WHEN sale_price > 0 AND quantity > 0 THEN CAST(sale_price AS REAL) / quantity END) AS high_price,
+           SUM(sale_price <= 0) AS refunded_orders,
+           TOTAL(CASE WHEN sale_price <= 0 THEN shipping_cost END) AS refund_shipping_cost,
+           MIN(sale_date) AS first_sale,
+           MAX(sale_date) AS last_sale
+    FROM pack_sales
+    {where}
+    GROUP BY set_name
+'''
+
+def _chunks(items: Sequence[str], size: int = 500) -> Iterable[Sequence[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _percentiles(values: List[float], qs: Sequence[float]) -> List[float]:
+    """Linearly interpolated percentiles of sorted values (NumPy's default method)"""
+    if np is not None:
+        return [float(v) for v in np.percentile(np.asarray(values, dtype=float), qs)]
+    last = len(values) - 1
+    result = []
+    for q in qs:
+        position = last * q / 100
+        lower = int(position)
+        upper = min(lower + 1, last)
+        result.append(values[lower] + (values[upper] - values[lower]) * (position - lower))
+    return result
+
+class SalesAnalytics:
+    """Maintain per-set sales metrics and write the sales_analysis.csv report
+
+    Sums, counts and price extremes come from one grouped SQL query; price
+    percentiles and monthly buckets are computed over arrays (with NumPy
+    when it is installed). Results are stored in the sales_summary table,
+    so after an import only the sets it touched need to be recomputed.
+    """
+
+    def __init__(self, db: InventoryDB):
+        self.db = db
+
+    @staticmethod
+    def _where(set_names: Optional[Sequence[str]]) -> tuple:
+        if set_names is None:
+            return '', ()
+        return f"WHERE set_name IN ({','.join('?' * len(set_names))})", tuple(set_names)
+
+    def _price_percentiles(self, set_names: Optional[Sequence[str]]) -> Dict[str, List[float]]:
+        """Percentiles of the per-unit price of each set's sales"""
+        where, params = self._where(set_names)
+        where = f"{where} AND" if where else "WHERE"
+        cursor = self.db.conn.execute(f'''
+            SELECT set_name, CAST(sale_price AS REAL) / quantity AS unit_price
+            FROM pack_sales
+            {where} sale_price > 0 AND quantity > 0
+            ORDER BY set_name, unit_price
+        ''', params)
+        return {
+            set_name: _percentiles([row[1] for row in rows], PERCENTILES)
+            for set_name, rows in groupby(cursor, key=lambda row: row[0])
+        }
+
+    def refresh(self, set_names: Optional[Iterable[str]] = None) -> int:
+        """
+        Recompute the summary for the given sets, or for every set
+
+        Returns the number of sets with sales that were recomputed.
+        """
+        names = sorted(set(set_names)) if set_names is not None else None
+        batches = list(_chunks(names)) if names is not None else [None]
+        refreshed = 0
+        with self.db.conn:
+            if names is None:
+                self.db.conn.execute('DELETE FROM sales_summary')
+            for batch in batches:
+                where, params = self._where(batch)
+                if batch is not None:
+                    self.db.conn.execute(f'DELETE FROM sales_summary {where}', params)
+                percentiles = self._price_percentiles(batch)
+                rows = []
+                for row in self.db.conn.execute(_AGGREGATE_SQL.format(where=where), params):
+                    p25, median, p75 = percentiles.get(row['set_name'], (None, None, None))
+                    rows.append((
+                        row['set_name'], row['orders'], int(row['units']), row['item_sales'],
+                        row['shipping_charged'], row['shipping_cost'], row['ebay_fees'],
+                        row['low_price'], row['high_price'], p25, median, p75,
+                        row['refunded_orders'], row['refund_shipping_cost'],
+                        row['first_sale'], row['last_sale']
+                    ))
+                self.db.conn.executemany('''
+                    INSERT INTO sales_summary (
+                        set_name, orders, units, item_sales, shipping_charged, shipping_cost,
+                        ebay_fees, low_price, high_price, p25_price, median_price, p75_price,
+                        refunded_orders, refund_shipping_cost, first_sale, last_sale, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+                ''', rows)
+                refreshed += len(rows)
+        return refreshed
+
+    def get_summary(self) -> List[Dict]:
+        """Per-set metrics, including the derived revenue and profit figures"""
+        summary = []
+        for row in self.db.conn.execute('SELECT * FROM sales_summary ORDER BY set_name'):
+            metrics = dict(row)
+            metrics["total_revenue"] = metrics["item_sales"] + metrics["shipping_charged"]
+            metrics["net_revenue"] = metrics["total_revenue"] - metrics["shipping_cost"] - metrics["ebay_fees"]
+            metrics["profit_per_unit"] = metrics["net_revenue"] / metrics["units"] if metrics["units"] else 0.0
+            metrics["shipping_profit"] = metrics["shipping_charged"] - metrics["shipping_cost"]
+            summary.append(metrics)
+        return summary
+
+    def monthly_totals(self, set_names: Optional[Sequence[str]] = None) -> Dict[str, List[Dict]]:
+        """Orders, units and net revenue per set per calendar month"""
+        where, params = self._where(set_names)
+        if np is None:
+            result: Dict[str, List[Dict]] = {}
+            for row in self.db.conn.execute(f'''
+                SELECT set_name, strftime('%Y-%m', sale_date) AS month, COUNT(*) AS orders,
+                       TOTAL(quantity) AS units,
+                       TOTAL(sale_price + shipping_charged - shipping_cost - ebay_fees) AS net_revenue
+                FROM pack_sales {where}
+                GROUP BY set_name, month ORDER BY set_name, month
+            ''', params):
+                result.setdefault(row['set_name'], []).append({
+                    "month": row['month'], "orders": row['orders'],
+                    "units": int(row['units']), "net_revenue": row['net_revenue']
+                })
+            return result
+
+        rows = self.db.conn.execute(f'''
+            SELECT set_name, sale_date, quantity,
+                   sale_price + shipping_charged - shipping_cost - ebay_fees
+            FROM pack_sales {where}
+        ''', params).fetchall()
+        if not rows:
+            return {}
+        sets, set_idx = np.unique(np.array([row[0] for row in rows]), return_inverse=True)
+        months = np.array([str(row[1])[:10] for row in rows], dtype='datetime64[D]').astype('datetime64[M]')
+        month_values, month_idx = np.unique(months, return_inverse=True)
+        keys = set_idx * len(month_values) + month_idx
+        buckets, bucket_idx = np.unique(keys, return_inverse=True)
+        orders = np.bincount(bucket_idx)
+        units = np.bincount(bucket_idx, weights=np.fromiter((row[2] for row in rows), float, len(rows)))
+        net = np.bincount(bucket_idx, weights=np.fromiter((row[3] for row in rows), float, len(rows)))
+
+        result = {}
+        for i, key in enumerate(buckets):
+            set_name = str(sets[key // len(month_values)])
+            result.setdefault(set_name, []).append({
+                "month": str(month_values[key % len(month_values)]),
+                "orders": int(orders[i]), "units": int(units[i]), "net_revenue": float(net[i])
+            })
+        return result
+
+    def slab_summary(self) -> List[Dict]:
+        """Per-set metrics of sold slabs, in the same shape as get_summary()"""
+        summary = []
+        for row in self.db.conn.execute('''
+            SELECT set_name, COUNT(*) AS orders, COUNT(*) AS units,
+                   TOTAL(sale_price) AS item_sales, TOTAL(shipping_charged) AS shipping_charged,
+                   TOTAL(shipping_cost) AS shipping_cost, TOTAL(ebay_fees) AS ebay_fees,
+                   MIN(sale_price) AS low_price, MAX(sale_price) AS high_price,
+                   0 AS refunded_orders, 0.0 AS refund_shipping_cost
+            FROM slabs WHERE sale_price > 0
+            GROUP BY set_name ORDER BY set_name
+        '''):
+            metrics = dict(row)
+            metrics["total_revenue"] = metrics["item_sales"] + metrics["shipping_charged"]
+            metrics["net_revenue"] = metrics["total_revenue"] - metrics["shipping_cost"] - metrics["ebay_fees"]
+            metrics["shipping_profit"] = metrics["shipping_charged"] - metrics["shipping_cost"]
+            summary.append(metrics)
+        return summary
+
+    def listings(self, where: str) -> List[Dict]:
+        """Individual pack sales matching a WHERE clause, with their revenue figures"""
+        listings = []
+        for row in self.db.conn.execute(f'''
+            SELECT set_name AS title, quantity, sale_price AS item_sales, shipping_charged,
+                   shipping_cost, ebay_fees
+            FROM pack_sales WHERE {where} ORDER BY sale_date, id
+        '''):
+            listing = dict(row)
+            listing["total_revenue"] = max(listing["item_sales"], 0) + listing["shipping_charged"]
+            listing["net_revenue"] = listing["total_revenue"] - listing["shipping_cost"] - listing["ebay_fees"]
+            listings.append(listing)
+        return listings
+
+    @staticmethod
+    def _preserve_foreign_report(report_path: str):
+        """Keep a copy of a report this module did not write before replacing it"""
+        if not os.path.exists(report_path):
+            return
+        with open(report_path, newline='') as f:
+            if any(row and row[0] == GENERATED_LABEL for row in csv.reader(f)):
+                return
+        backup_path = f"{os.path.splitext(report_path)[0]}.original.csv"
+        if not os.path.exists(backup_path):
+            shutil.copy2(report_path, backup_path)
+            print(f"Kept the existing {report_path} as {backup_path}")
+
+    def write_report(self, report_path: str = 'data/sales_analysis.csv') -> str:
+        """
+        Write the per-set report in the sales_analysis.csv layout
+
+        Sections follow the original eBay report: pack sales per set, slab
+        sales per set, pack sales whose set name did not resolve
+        (uncategorized listings) and refunded or zero-value orders, plus an
+        overall summary. Total Revenue is item sales plus shipping charged,
+        and Net Revenue subtracts shipping cost and eBay fees. A report that
+        was not written by this module is copied to "<name>.original.csv"
+        before it is first replaced.
+        """
+        known_sets = {row[0] for row in self.db.conn.execute('SELECT name FROM sets')}
+        everything = self.get_summary()
+        summary = [s for s in everything if s["set_name"] in known_sets]
+        slabs = self.slab_summary()
+        uncategorized = self.listings('sale_price > 0 AND set_name NOT IN (SELECT name FROM sets)')
+        refunds = self.listings('sale_price <= 0')
+        width = len(REPORT_COLUMNS)
+        money = lambda value: f"-${-value:.2f}" if value < 0 else f"${value:.2f}"
+        pad = lambda row: row + [''] * (width - len(row))
+
+        def sum_metrics(rows):
+            return {key: sum(s[key] for s in rows) for key in (
+                "orders", "units", "item_sales", "shipping_charged", "shipping_cost", "ebay_fees",
+                "total_revenue", "net_revenue", "shipping_profit", "refunded_orders", "refund_shipping_cost")}
+
+        def metrics_row(label, m, low, high):
+            profit_per_unit = m["net_revenue"] / m["units"] if m["units"] else 0.0
+            return [label, m["orders"], m["units"], money(m["item_sales"]), money(m["shipping_charged"]),
+                    money(m["shipping_cost"]), money(m["ebay_fees"]), money(m["total_revenue"]),
+                    money(m["net_revenue"]), money(profit_per_unit), money(m["shipping_profit"]),
+                    money(low or 0), money(high or 0), m["refunded_orders"]]
+
+        def listing_row(listing):
+            return pad([listing["title"], listing["quantity"], money(listing["item_sales"]),
+                        money(listing["shipping_charged"]), money(listing["shipping_cost"]),
+                        money(listing["ebay_fees"]), money(listing["total_revenue"]),
+                        money(listing["net_revenue"])])
+
+        def write_sales_section(writer, title, rows):
+            writer.writerow(pad([title]))
+            writer.writerow(REPORT_COLUMNS)
+            for s in rows:
+                writer.writerow(metrics_row(s["set_name"], s, s["low_price"], s["high_price"]))
+            writer.writerow(pad([]))
+            lows = [s["low_price"] for s in rows if s["low_price"] is not None]
+            highs = [s["high_price"] for s in rows if s["high_price"] is not None]
+            writer.writerow(metrics_row("TOTAL", sum_metrics(rows), min(lows, default=0), max(highs, default=0)))
+            writer.writerow(pad([]))
+            writer.writerow(pad([]))
+
+        totals = sum_metrics(everything)
+        self._preserve_foreign_report(report_path)
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        tmp_path = f"{report_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            write_sales_section(writer, "Pack Sales Analysis", summary)
+            write_sales_section(writer, "Slab Sales Analysis", slabs)
+
+            writer.writerow(pad(["Uncategorized Listings"]))
+            writer.writerow(pad(LISTING_COLUMNS))
+            for listing in uncategorized:
+                writer.writerow(listing_row(listing))
+            writer.writerow(pad([]))
+            writer.writerow(pad(["TOTAL UNCATEGORIZED", sum(l["quantity"] for l in uncategorized)] + [
+                money(sum(l[key] for l in uncategorized)) for key in (
+                    "item_sales", "shipping_charged", "shipping_cost", "ebay_fees", "total_revenue", "net_revenue")]))
+            writer.writerow(pad([]))
+            writer.writerow(pad([]))
+
+            writer.writerow(pad(["Refunded/Zero-Value Orders"]))
+            writer.writerow(pad(LISTING_COLUMNS))
+            for listing in refunds:
+                writer.writerow(listing_row(listing))
+            writer.writerow(pad([]))
+            writer.writerow(pad(["Total Refunded Orders", len(refunds)]))
+            writer.writerow(pad([]))
+            writer.writerow(pad([]))
+            writer.writerow(pad(["Overall Summary"]))
+            writer.writerow(pad(["Total Active Orders", totals["orders"]]))
+            writer.writerow(pad(["Total Refunded Orders", totals["refunded_orders"]]))
+            writer.writerow(pad(["Total Shipping Costs Lost", money(totals["refund_shipping_cost"])]))
+            writer.writerow(pad(["Total Items Sold", totals["units"]]))
+            writer.writerow(pad(["Total Revenue", money(totals["total_revenue"])]))
+            writer.writerow(pad(["Total Net Profit", money(totals["net_revenue"])]))
+            writer.writerow(pad(["Total Shipping Profit", money(totals["shipping_profit"])]))
+            writer.writerow(pad(["Total eBay Fees", money(totals["ebay_fees"])]))
+            writer.writerow(pad([]))
+            writer.writerow(pad([GENERATED_LABEL, datetime.now().isoformat(timespec='seconds')]))
+        os.replace(tmp_path, report_path)
+        return report_path
+
+def update_sales_analysis(db: InventoryDB, set_names: Optional[Iterable[str]] = None,
+                          report_path: str = 'data/sales_analysis.csv') -> str:
+    """
+    Recompute the given sets (or all of them) and rewrite the report
+
+    If sales_summary has never been filled, every set is recomputed, since
+    the report is built from it and would otherwise list only the given sets.
+    """
+    analytics = SalesAnalytics(db)
+    if set_names is not None and not db.conn.execute('SELECT 1 FROM sales_summary LIMIT 1').fetchone():
+        set_names = None
+    analytics.refresh(set_names)
+    return analytics.write_report(report_path)
+
+if __name__ == '__main__':
+    print(f"Wrote {update_sales_analysis(InventoryDB())}")
@@ -0,0 +1,132 @@
+"""
+Set name resolution shared by the CSV importers
+"""
+
+import os
+import re
+import json
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+# Words that carry no set identity in marketplace and PSA set names
+NOISE_TOKENS = {"pokemon", "japanese", "english", "tcg", "booster", "box", "pack", "packs", "sealed"}
+
+class SetResolver:
+    """Resolve free-form set names to names in the sets database
+
+    Names are looked up, in order, by their normalized tokens, by the same
+    tokens with noise words, series prefixes and set codes removed, by a
+    set code alias (e.g. "sv2a"), and finally by character trigram
+    similarity above a threshold. Results are memoized per input name.
+    """
+
+    def __init__(self, sets_data: Dict, threshold: float = 0.6):
+        self.threshold = threshold
+        self._names: Dict[str, str] = {}
+        self._codes: Dict[str, str] = {}
+        self._series_prefixes: List[List[str]] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._build(sets_data)
+
+    @staticmethod
+    def tokenize(name: str) -> List[str]:
+        """Lowercase, strip accents and split a name into alphanumeric tokens"""
+        text = unicodedata.normalize('NFKD', name)
+        text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+        return re.findall(r'[a-z0-9]+', text.replace('&', ' and '))
+
+    @staticmethod
+    def _trigram_set(key: str) -> Set[str]:
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _build(self, sets_data: Dict):
+        """Build the name, code and trigram indexes"""
+        code_names: Dict[str, Set[str]] = {}
+        for series_key, series in sets_data["series"].items():
+            self._series_prefixes.append(self.tokenize(series_key.replace('_', ' ')))
+            for set_type in ["main_sets", "special_sets"]:
+                for set_info in series.get(set_type, []):
+                    name = set_info["name"]
+                    tokens = self.tokenize(name)
+                    self._names.setdefault(' '.join(tokens), name)
+                    without_ex = [t for t in tokens if t != "ex"]
+                    if without_ex:
+                        self._names.setdefault(' '.join(without_ex), name)
+                    code = ''.join(self.tokenize(set_info.get("code", "")))
+                    if code:
+                        code_names.setdefault(code, set()).add(name)
+
+        # Codes shared by several sets (e.g. s10b) are too ambiguous to use as aliases
+        self._codes = {code: next(iter(names)) for code, names in code_names.items() if len(names) == 1}
+        self._ambiguous_codes = {code for code, names in code_names.items() if len(names) > 1}
+        self._trigrams = {key: self._trigram_set(key) for key in self._names}
+
+    def _strip(self, tokens: List[str]) -> List[str]:
+        """Drop noise words, a leading series name and set code tokens"""
+        tokens = [t for t in tokens if t not in NOISE_TOKENS]
+        for prefix in self._series_prefixes:
+            if tokens[:len(prefix)] == prefix and len(tokens) > len(prefix):
+                tokens = tokens[len(prefix):]
+                break
+        return [t for t in tokens if t not in self._codes and t not in self._ambiguous_codes]
+
+    def _lookup(self, name: str) -> Optional[str]:
+        tokens = self.tokenize(name)
+        if not tokens:
+            return None
+
+        key = ' '.join(tokens)
+        if key in self._names:
+            return self._names[key]
+
+        stripped = self._strip(tokens)
+        stripped_key = ' '.join(stripped)
+        if stripped_key in self._names:
+            return self._names[stripped_key]
+        no_ex_key = ' '.join(t for t in stripped if t != "ex")
+        if no_ex_key in self._names:
+            return self._names[no_ex_key]
+
+        for token in tokens:
+            if token in self._codes:
+                return self._codes[token]
+
+        # Fuzzy fallback on the stripped name
+        query = self._trigram_set(stripped_key or key)
+        best_name, best_score = None, 0.0
+        for candidate, grams in self._trigrams.items():
+            score = len(query & grams) / len(query | grams)
+            if score > best_score:
+                best_name, best_score = self._names[candidate], score
+        return best_name if best_score >= self.threshold else None
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Resolve a set name, returning None when nothing matches well enough"""
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        result = self._lookup(name)
+        with self._lock:
+            self._cache[name] = result
+        return result
+
+_resolvers: Dict[str, tuple] = {}
+_resolvers_lock = threading.Lock()
+
+def get_set_resolver(sets_path: str = 'data/pokemon_sets.json') -> SetResolver:
+    """Get a resolver for a sets file, rebuilt only when the file changes"""
+    key = os.path.abspath(sets_path)
+    mtime = os.path.getmtime(sets_path)
+    with _resolvers_lock:
+        cached = _resolvers.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(sets_path, 'r') as f:
+            resolver = SetResolver(json.load(f))
+        _resolvers[key] = (mtime, resolver)
+        return resolver
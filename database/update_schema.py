@@ -1,36 +1,35 @@
 """
-Update database schema to add missing columns.
+Update database schema by applying pending migrations.
 Run this script to update an existing database with new schema changes.
 """
 
-from inventory_db import InventoryDB
+import os
+import sys
 
-def main():
+# Add the project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import get_pool
+from database.migrations import get_version, migrate
+
+def main(db_path: str = "data/inventory.db"):
     print("Updating database schema...")
-    db = InventoryDB()
+    pool = get_pool(db_path)
     
     try:
-        with db.conn:
-            # Check if ebay_fees column exists in pack_sales
-            cursor = db.conn.execute("PRAGMA table_info(pack_sales)")
-            columns = [row['name'] for row in cursor.fetchall()]
-            
-            if 'ebay_fees' not in columns:
-                print("Adding ebay_fees column to pack_sales table...")
-                db.conn.execute('''
-                    ALTER TABLE pack_sales
-                    ADD COLUMN ebay_fees DECIMAL NOT NULL DEFAULT 0
-                ''')
-                print("Successfully added ebay_fees column")
-            else:
-                print("ebay_fees column already exists")
-                
+        before = get_version(pool.connection())
+        after = migrate(pool.connection())
+        if after == before:
+            print(f"Schema already at version {after}")
+        else:
+            print(f"Migrated schema from version {before} to {after}")
+        
         print("\nSchema update complete!")
         
     except Exception as e:
         print(f"Error updating schema: {str(e)}")
     finally:
-        db.close()
+        pool.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(*sys.argv[1:2])
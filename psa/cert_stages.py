@@ -0,0 +1,109 @@
+"""
+Per-cert stage tracking for the PSA details/images pipeline
+"""
+
+import os
+import json
+from typing import Dict, List, Optional
+from database.inventory_db import InventoryDB
+
+SIDES = ('front', 'back')
+
+def unavailable_side(image_urls: Optional[Dict[str, Optional[str]]], side: str) -> bool:
+    """Whether image URLs record that PSA provides no image for a side (a None URL)"""
+    return image_urls is not None and side in image_urls and not image_urls[side]
+
+class CertStages:
+    """Progress of one cert through the pipeline"""
+
+    def __init__(self, cert_number: str, details: Optional[Dict] = None,
+                 image_urls: Optional[Dict[str, str]] = None,
+                 front_path: Optional[str] = None, back_path: Optional[str] = None):
+        self.cert_number = cert_number
+        self.details = details
+        self.image_urls = image_urls
+        self.front_path = front_path
+        self.back_path = back_path
+
+    def image_path(self, side: str) -> Optional[str]:
+        """Saved image path for a side, if its download stage is done and the file still exists"""
+        path = getattr(self, f'{side}_path')
+        return path if path and os.path.exists(path) else None
+
+    def unavailable(self, side: str) -> bool:
+        """Whether PSA's images response had images, but none for this side"""
+        return unavailable_side(self.image_urls, side)
+
+    @property
+    def missing_sides(self) -> List[str]:
+        """Sides whose image still needs downloading; sides PSA has no image for are skipped"""
+        return [side for side in SIDES if not self.image_path(side) and not self.unavailable(side)]
+
+    @property
+    def api_calls_needed(self) -> int:
+        """API calls still needed to finish this cert"""
+        calls = 0 if self.details is not None else 1
+        if self.image_urls is None and self.missing_sides:
+            calls += 1
+        return calls
+
+    @property
+    def complete(self) -> bool:
+        """Whether every stage has been done"""
+        return self.details is not None and not self.missing_sides
+
+class CertStageStore:
+    """Persist per-cert pipeline stages in the psa_cert_stages table
+
+    The stages are: details fetched, image URLs fetched, front downloaded and
+    back downloaded. Details and image URLs are cached as JSON so a rerun
+    after a failed download reuses them instead of spending API calls again.
+    """
+
+    def __init__(self, db: InventoryDB):
+        self.db = db
+
+    def get(self, cert_number: str) -> CertStages:
+        """Load a cert's stages; a cert never seen before has none done"""
+        row = self.db.conn.execute('''
+            SELECT details_json, image_urls_json, front_path, back_path
+            FROM psa_cert_stages WHERE cert_number = ?
+        ''', (cert_number,)).fetchone()
+        if row is None:
+            return CertStages(cert_number)
+        return CertStages(
+            cert_number,
+            details=json.loads(row['details_json']) if row['details_json'] else None,
+            image_urls=json.loads(row['image_urls_json']) if row['image_urls_json'] else None,
+            front_path=row['front_path'],
+            back_path=row['back_path']
+        )
+
+    def _upsert(self, cert_number: str, assignments: str, params: tuple):
+        with self.db.conn:
+            self.db.conn.execute('INSERT OR IGNORE INTO psa_cert_stages (cert_number) VALUES (?)',
+                                 (cert_number,))
+            self.db.conn.execute(f'''
+                UPDATE psa_cert_stages SET {assignments}, updated_at = datetime('now')
+                WHERE cert_number = ?
+            ''', params + (cert_number,))
+
+    def save_details(self, cert_number: str, details: Dict):
+        """Record the details stage as done"""
+        self._upsert(cert_number, "details_json = ?, details_fetched_at = datetime('now')",
+                     (json.dumps(details),))
+
+    def save_image_urls(self, cert_number: str, image_urls: Dict[str, str]):
+        """Record the image URLs stage as done"""
+        self._upsert(cert_number, "image_urls_json = ?, image_urls_fetched_at = datetime('now')",
+                     (json.dumps(image_urls),))
+
+    def clear_image_urls(self, cert_number: str):
+        """Forget cached image URLs, e.g. after they stopped working"""
+        self._upsert(cert_number, "image_urls_json = NULL, image_urls_fetched_at = NULL", ())
+
+    def mark_downloaded(self, cert_number: str, side: str, path: str):
+        """Record a front or back download stage as done"""
+        if side not in SIDES:
+            raise ValueError(f"Unknown image side: {side}")
+        self._upsert(cert_number, f"{side}_path = ?, {side}_downloaded_at = datetime('now')", (path,))
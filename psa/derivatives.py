@@ -0,0 +1,194 @@
+"""
+Thumbnail and web-optimized derivatives of PSA slab images
+"""
+
+import os
+import json
+import hashlib
+import threading
+import importlib.util
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+# Derivative name -> (max width, max height, JPEG quality)
+DERIVATIVES = {
+    "thumb": (160, 270, 80),
+    "web": (800, 1350, 85)
+}
+
+SIDES = ('front', 'back')
+
+def pillow_available() -> bool:
+    """Whether the optional Pillow dependency is installed"""
+    return importlib.util.find_spec('PIL') is not None
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def render_derivatives(source_path: str) -> Dict[str, Dict]:
+    """
+    Create every derivative of one source image; runs in a worker process
+
+    Derivatives are written next to the source as "<stem>_<name>.jpg" via a
+    temp file and rename. Returns manifest entries keyed by derivative name.
+    """
+    from PIL import Image, ImageOps
+
+    stem = os.path.splitext(source_path)[0]
+    stat = os.stat(source_path)
+    entries = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+        for name, (width, height, quality) in DERIVATIVES.items():
+            derivative = image.copy()
+            derivative.thumbnail((width, height), Image.LANCZOS)
+            path = f"{stem}_{name}.jpg"
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            derivative.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+            entries[name] = {
+                "path": path,
+                "sha256": _file_sha256(path),
+                "width": derivative.width,
+                "height": derivative.height,
+                "bytes": os.path.getsize(path),
+                "source_size": stat.st_size,
+                "source_mtime": stat.st_mtime
+            }
+    return entries
+
+class DerivativeStore:
+    """Generate slab image derivatives and track them in a manifest
+
+    Images are rendered on a process pool, either as each image finishes
+    downloading (submit) or for everything already on disk (backfill). The
+    manifest at "<image_dir>/derivatives.json" maps "<cert>/<side>/<name>"
+    to the derivative's path relative to image_dir, its SHA-256 and size,
+    and the size/mtime of the source it was rendered from, so stale
+    derivatives are detected and the hash can be used for cache busting.
+
+    Pillow is optional; without it submit() and backfill() do nothing.
+    """
+
+    def __init__(self, image_dir: str, max_workers: Optional[int] = None):
+        self.image_dir = image_dir
+        self.manifest_path = os.path.join(image_dir, 'derivatives.json')
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Dict] = {}
+        self._manifest_mtime = None
+
+    @staticmethod
+    def _key(cert_number: str, side: str, name: str) -> str:
+        return f"{cert_number}/{side}/{name}"
+
+    @staticmethod
+    def _parse_source(source_path: str) -> Optional[tuple]:
+        """(cert_number, side) for a "<cert>_<side>.jpg" source image"""
+        base = os.path.splitext(os.path.basename(source_path))[0]
+        cert_number, _, side = base.rpartition('_')
+        return (cert_number, side) if cert_number and side in SIDES else None
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """The manifest, reloaded when another process has rewritten it"""
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except FileNotFoundError:
+            return self._manifest
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, 'r') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    def lookup(self, cert_number: str, side: str, name: str) -> Optional[Dict]:
+        """Manifest entry for a derivative, with an absolute path, if it exists"""
+        with self._lock:
+            entry = self._load_manifest().get(self._key(cert_number, side, name))
+        if entry is None:
+            return None
+        return dict(entry, path=os.path.join(self.image_dir, entry["path"]))
+
+    def is_current(self, source_path: str) -> bool:
+        """Whether every derivative of a source image is up to date"""
+        parsed = self._parse_source(source_path)
+        if parsed is None:
+            return True
+        stat = os.stat(source_path)
+        with self._lock:
+            manifest = self._load_manifest()
+            for name in DERIVATIVES:
+                entry = manifest.get(self._key(*parsed, name))
+                if (entry is None or entry["source_size"] != stat.st_size
+                        or entry["source_mtime"] != stat.st_mtime
+                        or not os.path.exists(os.path.join(self.image_dir, entry["path"]))):
+                    return False
+        return True
+
+    def _record(self, source_path: str, future: Future):
+        """Add a finished render to the manifest"""
+        if future.exception() is not None:
+            return
+        cert_number, side = self._parse_source(source_path)
+        with self._lock:
+            manifest = self._load_manifest()
+            for name, entry in future.result().items():
+                entry["path"] = os.path.relpath(entry["path"], self.image_dir)
+                manifest[self._key(cert_number, side, name)] = entry
+            self._save_manifest()
+
+    def _render(self, source_path: str) -> Optional[Future]:
+        if not pillow_available() or self._parse_source(source_path) is None:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool.submit(render_derivatives, source_path)
+
+    def submit(self, source_path: str) -> Optional[Future]:
+        """Render the derivatives of one source image in the background"""
+        future = self._render(source_path)
+        if future is not None:
+            future.add_done_callback(lambda f: self._record(source_path, f))
+        return future
+
+    def backfill(self) -> int:
+        """Render derivatives for every source image that lacks current ones; returns the count"""
+        futures: List[tuple] = []
+        for root, _, files in os.walk(self.image_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if not filename.endswith('.jpg') or self._parse_source(path) is None:
+                    continue
+                if not self.is_current(path):
+                    future = self._render(path)
+                    if future is not None:
+                        futures.append((path, future))
+        for path, future in futures:
+            self._record(path, future)
+        return sum(1 for _, future in futures if future.exception() is None)
+
+    def close(self):
+        """Wait for pending renders and shut down the process pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+if __name__ == '__main__':
+    from config.config import Config
+    store = DerivativeStore(os.path.join(Config().data_dir, 'psa', 'images'))
+    print(f"Rendered derivatives for {store.backfill()} images")
+    store.close()
@@ -0,0 +1,137 @@
+"""
+Streaming, resumable image downloads for PSA slab images
+"""
+
+import os
+import re
+import json
+from typing import Dict, Optional
+import requests
+from psa.rate_limiter import PSARateLimiter
+
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+class DownloadError(Exception):
+    """Raised when a download is incomplete or not a valid image"""
+
+class ImageDownloader:
+    """Download images to disk without buffering them in memory
+
+    The body is streamed in chunks into "<path>.part", checked against
+    Content-Length and the JPEG magic bytes, fsynced and then renamed over
+    the final path, so a crash can never leave a truncated image in place.
+    An interrupted download keeps its .part file and resumes with an HTTP
+    Range request (guarded by If-Range on the ETag). The ETag of a finished
+    image is kept in "<path>.meta" so later downloads are conditional and a
+    304 response keeps the existing file.
+    """
+
+    def __init__(self, session: requests.Session, rate_limiter: PSARateLimiter,
+                 chunk_size: int = 64 * 1024, timeout: float = 10):
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    @staticmethod
+    def _read_meta(path: str) -> Dict:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def download(self, url: str, save_path: str, headers: Optional[Dict] = None) -> bool:
+        """
+        Download url to save_path
+
+        Returns True when save_path holds a complete image, either freshly
+        downloaded or confirmed unchanged by a 304. Raises DownloadError if
+        the body is truncated or not a JPEG, and returns False for other
+        non-success responses.
+        """
+        part_path = f"{save_path}.part"
+        part_meta_path = f"{part_path}.meta"
+        meta_path = f"{save_path}.meta"
+        request_headers = dict(headers or {})
+        # JPEGs gain nothing from compression, and byte ranges and
+        # Content-Length only match the file when the body is not encoded
+        request_headers.setdefault('Accept-Encoding', 'identity')
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        part_meta = self._read_meta(part_meta_path) if offset else {}
+        if offset and part_meta.get("url") == url and part_meta.get("etag"):
+            request_headers['Range'] = f'bytes={offset}-'
+            request_headers['If-Range'] = part_meta["etag"]
+        else:
+            offset = 0
+            if os.path.exists(save_path):
+                etag = self._read_meta(meta_path).get("etag")
+                if etag:
+                    request_headers['If-None-Match'] = etag
+
+        response = self.rate_limiter.request(
+            lambda: self.session.get(url, headers=request_headers, timeout=self.timeout, stream=True))
+        with response:
+            if response.status_code == 304 and 'If-None-Match' in request_headers:
+                return True
+            encoding = response.headers.get('Content-Encoding', 'identity').lower()
+            if response.status_code == 206:
+                match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+                if not match or int(match.group(1)) != offset or encoding != 'identity':
+                    self._remove(part_path)
+                    raise DownloadError(f"Unexpected Content-Range for {url}")
+                mode = 'ab'
+            elif response.status_code == 200:
+                # Full body: the server ignored the range or the image changed
+                offset = 0
+                mode = 'wb'
+            else:
+                return False
+
+            length = response.headers.get('Content-Length')
+            # iter_content() yields decoded bytes, so an encoded length cannot be checked
+            expected = offset + int(length) if length is not None and encoding == 'identity' else None
+            etag = response.headers.get('ETag')
+            written = offset
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            self._write_meta(part_meta_path, {"url": url, "etag": etag})
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        if expected is not None and written != expected:
+            # Keep the partial file so the next attempt can resume it
+            raise DownloadError(f"Incomplete download of {url}: {written} of {expected} bytes")
+
+        with open(part_path, 'rb') as f:
+            magic = f.read(len(JPEG_MAGIC))
+        if magic != JPEG_MAGIC:
+            self._remove(part_path)
+            self._remove(part_meta_path)
+            raise DownloadError(f"Downloaded file from {url} is not a JPEG")
+
+        os.replace(part_path, save_path)
+        self._remove(part_meta_path)
+        if etag:
+            self._write_meta(meta_path, {"url": url, "etag": etag, "size": written})
+        else:
+            self._remove(meta_path)
+        return True
@@ -4,68 +4,132 @@ PSA API call tracking and management
 
 import json
 import os
-from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 from config.config import Config
+from database.inventory_db import InventoryDB
 
 class PSAApiTracker:
-    """Track and manage PSA API calls"""
-    
-    def __init__(self, config: Config):
+    """Track and manage PSA API calls
+
+    Daily counts live in the psa_api_usage table and are changed with single
+    UPDATE statements, so several processors in different threads or
+    processes share one accurate quota. Each call is also logged to
+    psa_api_calls, which is pruned to the last retention_days days.
+
+    A quota day starts at psa_api.reset_hour UTC.
+    """
+
+    # import_watermarks source recording that the old JSON log was imported
+    JSON_LOG_SOURCE = 'psa_api_json_log'
+
+    def __init__(self, config: Config, db: Optional[InventoryDB] = None, retention_days: int = 30):
         self.config = config
-        self.log_data = self._load_log()
-    
-    def _load_log(self) -> Dict:
-        """Load existing log or create new one"""
-        if os.path.exists(self.config.api_log_file):
-            with open(self.config.api_log_file, 'r') as f:
-                return json.load(f)
-        return {
-            "daily_logs": {},
-            "last_reset": None
-        }
-    
-    def _save_log(self):
-        """Save current log data"""
-        with open(self.config.api_log_file, 'w') as f:
-            json.dump(self.log_data, f, indent=2)
-    
+        self.db = db or InventoryDB()
+        self.retention_days = retention_days
+        self._migrate_json_log()
+
+    @property
+    def daily_limit(self) -> int:
+        """Calls allowed per quota day"""
+        return self.config.config["psa_api"]["daily_limit"]
+
+    def _migrate_json_log(self):
+        """Import daily counts from the old JSON log once
+
+        The file is left in place; an import_watermarks row records that it
+        has been imported.
+        """
+        log_file = self.config.api_log_file
+        if not os.path.exists(log_file):
+            return
+        if self.db.conn.execute(
+                'SELECT 1 FROM import_watermarks WHERE source = ?', (self.JSON_LOG_SOURCE,)).fetchone():
+            return
+        with open(log_file, 'r') as f:
+            log_data = json.load(f)
+        days = [(date, day.get("calls", 0)) for date, day in log_data.get("daily_logs", {}).items()]
+        with self.db.conn:
+            cursor = self.db.conn.execute('''
+                INSERT OR IGNORE INTO import_watermarks (source, rows_imported, imported_at)
+                VALUES (?, ?, datetime('now'))
+            ''', (self.JSON_LOG_SOURCE, len(days)))
+            if cursor.rowcount:
+                # Another tracker may have imported it since the check above
+                self.db.conn.executemany('''
+                    INSERT OR IGNORE INTO psa_api_usage (date, calls_made) VALUES (?, ?)
+                ''', days)
+
     def _get_current_date(self) -> str:
-        """Get current date in YYYY-MM-DD format"""
-        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
-    
-    def _check_reset(self):
-        """Check if daily count should be reset"""
-        current_date = self._get_current_date()
-        if self.log_data["last_reset"] != current_date:
-            self.log_data["last_reset"] = current_date
-            self.log_data["daily_logs"][current_date] = {
-                "calls": 0,
-                "cert_numbers": []
-            }
-            self._save_log()
-    
+        """Get the current quota day in YYYY-MM-DD format"""
+        reset_hour = self.config.config["psa_api"].get("reset_hour", 0)
+        return (datetime.now(timezone.utc) - timedelta(hours=reset_hour)).strftime('%Y-%m-%d')
+
+    def _start_day(self, date: str):
+        """Create the counter for a quota day, pruning the call log when a new day begins"""
+        cursor = self.db.conn.execute('''
+            INSERT OR IGNORE INTO psa_api_usage (date, calls_made) VALUES (?, 0)
+        ''', (date,))
+        if cursor.rowcount:
+            cutoff = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+            self.db.conn.execute('DELETE FROM psa_api_calls WHERE date < ?', (cutoff,))
+
+    def _log_call(self, date: str, cert_number: str):
+        self.db.conn.execute('''
+            INSERT INTO psa_api_calls (date, cert_number) VALUES (?, ?)
+        ''', (date, cert_number))
+
     def get_calls_remaining(self) -> int:
         """Get number of API calls remaining for today"""
-        self._check_reset()
-        current_date = self._get_current_date()
-        daily_calls = self.log_data["daily_logs"].get(current_date, {}).get("calls", 0)
-        return max(0, self.config.config["psa_api"]["daily_limit"] - daily_calls)
-    
+        row = self.db.conn.execute('''
+            SELECT calls_made FROM psa_api_usage WHERE date = ?
+        ''', (self._get_current_date(),)).fetchone()
+        return max(0, self.daily_limit - (row[0] if row else 0))
+
     def record_api_call(self, cert_number: str):
         """Record an API call for a specific cert number"""
-        self._check_reset()
-        current_date = self._get_current_date()
-        
-        if current_date not in self.log_data["daily_logs"]:
-            self.log_data["daily_logs"][current_date] = {"calls": 0, "cert_numbers": []}
-        
-        self.log_data["daily_logs"][current_date]["calls"] += 1
-        self.log_data["daily_logs"][current_date]["cert_numbers"].append(cert_number)
-        self._save_log()
-    
+        date = self._get_current_date()
+        with self.db.conn:
+            self._start_day(date)
+            self.db.conn.execute('''
+                UPDATE psa_api_usage SET calls_made = calls_made + 1 WHERE date = ?
+            ''', (date,))
+            self._log_call(date, cert_number)
+
+    def try_record_api_call(self, cert_number: str) -> Optional[str]:
+        """Record an API call only if today's limit allows it
+
+        Returns the quota day the call was counted against, or None when the
+        limit has been reached.
+        """
+        date = self._get_current_date()
+        with self.db.conn:
+            self._start_day(date)
+            cursor = self.db.conn.execute('''
+                UPDATE psa_api_usage SET calls_made = calls_made + 1
+                WHERE date = ? AND calls_made < ?
+            ''', (date, self.daily_limit))
+            if cursor.rowcount == 0:
+                return None
+            self._log_call(date, cert_number)
+            return date
+
+    def refund_api_call(self, cert_number: str, date: str):
+        """Give back a call that never reached PSA to the quota day try_record_api_call returned"""
+        with self.db.conn:
+            cursor = self.db.conn.execute('''
+                UPDATE psa_api_usage SET calls_made = calls_made - 1
+                WHERE date = ? AND calls_made > 0
+            ''', (date,))
+            if cursor.rowcount:
+                self.db.conn.execute('''
+                    DELETE FROM psa_api_calls WHERE id = (
+                        SELECT MAX(id) FROM psa_api_calls WHERE date = ? AND cert_number = ?
+                    )
+                ''', (date, cert_number))
+
     def get_processed_certs(self) -> List[str]:
         """Get list of all processed cert numbers for today"""
-        self._check_reset()
-        current_date = self._get_current_date()
-        return self.log_data["daily_logs"].get(current_date, {}).get("cert_numbers", [])
\ No newline at end of file
+        return [row[0] for row in self.db.conn.execute('''
+            SELECT cert_number FROM psa_api_calls WHERE date = ? ORDER BY id
+        ''', (self._get_current_date(),))]
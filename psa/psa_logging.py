@@ -0,0 +1,74 @@
+"""
+Queued, structured logging for the PSA pipeline
+"""
+
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+_listeners: Dict[str, QueueListener] = {}
+_listeners_lock = threading.Lock()
+
+def setup_psa_logging(log_path: str, level: str = "INFO", max_bytes: int = 5 * 1024 * 1024,
+                      backup_count: int = 5, logger_name: str = 'psa') -> logging.Logger:
+    """
+    Route the PSA loggers through a queue to a rotating JSON log file
+
+    Callers only pay for putting the record on an in-memory queue; a single
+    QueueListener thread formats and writes records, rotating the file at
+    max_bytes. Records below `level` are dropped before they are queued.
+    Calling this again for the same file only updates the level.
+    """
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    with _listeners_lock:
+        if log_path in _listeners:
+            return logger
+
+        file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(stop_psa_logging, log_path)
+        _listeners[log_path] = listener
+
+        logger.addHandler(QueueHandler(log_queue))
+        logger.propagate = False
+    return logger
+
+def stop_psa_logging(log_path: Optional[str] = None):
+    """Flush and stop the listener for a log file, or all of them"""
+    with _listeners_lock:
+        paths = [log_path] if log_path else list(_listeners)
+        for path in paths:
+            listener = _listeners.pop(path, None)
+            if listener is not None:
+                listener.stop()
@@ -3,23 +3,56 @@ PSA data processing and image downloading with database integration
 """
 
 import os
-import csv
 import json
 import time
+import logging
+import threading
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 from config.config import Config
 from psa.psa_api_tracker import PSAApiTracker
+from psa.rate_limiter import PSARateLimiter, QuotaExhaustedError
+from psa.cert_stages import SIDES, CertStageStore, unavailable_side
+from psa.response_cache import PSAResponseCache
+from psa.image_downloader import ImageDownloader
+from psa.derivatives import DerivativeStore
+from psa.psa_queue import PSAWorkQueue, PSAQueueWorker, read_submission_jobs
+from psa.psa_logging import setup_psa_logging
 from database.inventory_db import InventoryDB
 
+logger = logging.getLogger(__name__)
+
 class PSAProcessor:
-    """Handle PSA data processing and image downloading"""
+    """Handle PSA data processing and image downloading
+    
+    Certs are processed on a pool of psa_api.max_workers threads. All HTTP
+    calls share one requests.Session so connections are kept alive, and a
+    separate I/O pool fetches image metadata and downloads images while the
+    cert details call is in flight. Every request goes through one
+    PSARateLimiter, which paces API calls and enforces the daily quota.
+    
+    Submission files are enqueued into a persistent PSAWorkQueue; whatever
+    today's quota cannot cover stays queued and is picked up by the next
+    process_queue() call or by the background worker started with
+    start_worker().
+    
+    Log records go through setup_psa_logging() to a rotating JSON log in the
+    PSA data directory (settings under psa_api.logging). Each processed cert
+    gets an INFO record with its API latency, download bytes and total time.
+    """
     
     def __init__(self, config: Config):
         self.config = config
-        self.api_tracker = PSAApiTracker(config)
+        psa_config = config.config.get("psa_api", {})
+        self.max_workers = max(1, int(psa_config.get("max_workers", 4)))
         self.db = InventoryDB()  # Database connection
+        self.api_tracker = PSAApiTracker(config, self.db)
+        self.rate_limiter = PSARateLimiter(config, self.api_tracker)
+        self.stages = CertStageStore(self.db)
+        self.queue = PSAWorkQueue(self.db)
+        self.worker = PSAQueueWorker(self, self.queue)
         self._load_oauth_token()
         
         # Ensure required directories exist
@@ -27,6 +60,16 @@ class PSAProcessor:
         self.image_dir = os.path.join(self.psa_data_dir, 'images')
         os.makedirs(self.psa_data_dir, exist_ok=True)
         os.makedirs(self.image_dir, exist_ok=True)
+        log_config = psa_config.get("logging", {})
+        setup_psa_logging(os.path.join(self.psa_data_dir, 'psa.log'),
+                          level=log_config.get("level", "INFO"),
+                          max_bytes=int(log_config.get("max_bytes", 5 * 1024 * 1024)),
+                          backup_count=int(log_config.get("backup_count", 5)))
+        self._metrics: Dict[str, Dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.derivatives = DerivativeStore(self.image_dir)
+        self.response_cache = PSAResponseCache(os.path.join(self.psa_data_dir, 'cache'),
+                                               psa_config.get("cache_ttl", Config.DEFAULT_CONFIG["psa_api"]["cache_ttl"]))
         
         # API configuration
         self.api_headers = {
@@ -34,6 +77,22 @@ class PSAProcessor:
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json'
         }
+        
+        # Shared keep-alive connections for API calls and image downloads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers * 3)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.downloader = ImageDownloader(self.session, self.rate_limiter)
+        self._io_pool = ThreadPoolExecutor(max_workers=self.max_workers * 2,
+                                           thread_name_prefix='psa-io')
+    
+    def close(self):
+        """Shut down worker threads and pooled connections"""
+        self.worker.stop()
+        self._io_pool.shutdown(wait=True)
+        self.derivatives.close()
+        self.session.close()
     
     def _load_oauth_token(self):
         """Load OAuth token from config or file"""
@@ -49,16 +108,22 @@ class PSAProcessor:
             else:
                 raise ValueError("No OAuth token found in config or token file")
     
-    def _log_debug(self, message: str):
-        """Log debug message with timestamp"""
-        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-        log_file = os.path.join(self.psa_data_dir, 'debug.log')
-        with open(log_file, 'a') as f:
-            f.write(f"[{timestamp}] {message}\n")
+    def _add_metrics(self, cert_number: Optional[str], **values):
+        """Accumulate timing fields for the cert currently being processed"""
+        if cert_number is None:
+            return
+        with self._metrics_lock:
+            metrics = self._metrics.get(cert_number)
+            if metrics is not None:
+                for key, value in values.items():
+                    metrics[key] = metrics.get(key, 0) + value
     
     def is_cert_complete(self, cert_number: str) -> bool:
         """Check if a certificate has been fully processed"""
-        # First check database for the slab
+        if self.stages.get(cert_number).complete:
+            return True
+        
+        # Certs processed before stage tracking: check database for the slab
         slab = self.db.get_slab_by_cert(cert_number)
         if not slab:
             return False
@@ -72,43 +137,57 @@ class PSAProcessor:
         
         return False
     
-    def get_cert_details(self, cert_number: str) -> Optional[Dict]:
-        """Get certificate details from PSA API"""
-        url = f'https://api.psacard.com/publicapi/cert/GetByCertNumber/{cert_number}'
-        self._log_debug(f"Requesting cert details for {cert_number}")
+    def _get_api(self, endpoint: str, url: str, key: str) -> Optional[Dict]:
+        """GET a PSA API endpoint, answering from the response cache when possible
+        
+        Cache hits do not go through the rate limiter, so they spend no quota.
+        """
+        cached = self.response_cache.get(endpoint, key)
+        if cached is not None:
+            logger.debug("Cache hit for %s %s", endpoint, key, extra={"cert_number": key, "endpoint": endpoint})
+            self._add_metrics(key, cache_hits=1)
+            return cached
         
         try:
-            response = requests.get(url, headers=self.api_headers, timeout=10)
+            started = time.perf_counter()
+            response = self.rate_limiter.request(
+                lambda: self.session.get(url, headers=self.api_headers, timeout=10), key)
+            api_ms = (time.perf_counter() - started) * 1000
+            self._add_metrics(key, api_calls=1, api_ms=api_ms)
+            logger.debug("Requested %s for %s: %d", endpoint, key, response.status_code,
+                         extra={"cert_number": key, "endpoint": endpoint,
+                                "status": response.status_code, "api_ms": round(api_ms, 1)})
             if response.status_code == 200:
-                self.api_tracker.record_api_call(cert_number)
-                return response.json()
+                data = response.json()
+                self.response_cache.put(endpoint, key, data)
+                return data
             else:
-                self._log_debug(f"Error {response.status_code}: {response.text}")
+                logger.warning("Error %d from %s for %s: %s", response.status_code, endpoint, key, response.text,
+                               extra={"cert_number": key, "endpoint": endpoint})
                 return None
+        except QuotaExhaustedError:
+            raise
         except Exception as e:
-            self._log_debug(f"Error getting cert details: {str(e)}")
+            logger.warning("Error getting %s for %s: %s", endpoint, key, e,
+                           extra={"cert_number": key, "endpoint": endpoint})
             return None
     
+    def get_cert_details(self, cert_number: str) -> Optional[Dict]:
+        """Get certificate details from PSA API"""
+        url = f'https://api.psacard.com/publicapi/cert/GetByCertNumber/{cert_number}'
+        return self._get_api('cert_details', url, cert_number)
+    
     def get_cert_images(self, cert_number: str) -> Optional[Dict]:
         """Get certificate images from PSA API"""
         url = f'https://api.psacard.com/publicapi/cert/GetImagesByCertNumber/{cert_number}'
-        self._log_debug(f"Requesting images for {cert_number}")
-        
-        try:
-            response = requests.get(url, headers=self.api_headers, timeout=10)
-            if response.status_code == 200:
-                self.api_tracker.record_api_call(cert_number)
-                return response.json()
-            else:
-                self._log_debug(f"Error {response.status_code}: {response.text}")
-                return None
-        except Exception as e:
-            self._log_debug(f"Error getting cert images: {str(e)}")
-            return None
+        return self._get_api('cert_images', url, cert_number)
     
-    def download_image(self, url: str, save_path: str) -> bool:
-        """Download image from URL"""
-        self._log_debug(f"Downloading image from {url}")
+    def invalidate_cached_responses(self, cert_number: str) -> int:
+        """Drop cached API responses for a cert so the next request refetches them"""
+        return self.response_cache.invalidate_key(cert_number)
+    
+    def download_image(self, url: str, save_path: str, cert_number: Optional[str] = None) -> bool:
+        """Download image from URL, streaming it to disk and resuming partial downloads"""
         
         headers = {
             'User-Agent': self.api_headers['User-Agent'],
@@ -116,53 +195,129 @@ class PSAProcessor:
         }
         
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200 and len(response.content) > 1000:
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                return True
-            return False
+            started = time.perf_counter()
+            success = self.downloader.download(url, save_path, headers)
+            download_ms = (time.perf_counter() - started) * 1000
+            size = os.path.getsize(save_path) if success else 0
+            self._add_metrics(cert_number, download_ms=download_ms, download_bytes=size)
+            logger.debug("Downloaded %s to %s", url, save_path,
+                         extra={"cert_number": cert_number, "success": success,
+                                "download_ms": round(download_ms, 1), "download_bytes": size})
+            return success
         except Exception as e:
-            self._log_debug(f"Error downloading image: {str(e)}")
+            logger.warning("Error downloading image %s: %s", url, e, extra={"cert_number": cert_number})
             return False
     
+    @staticmethod
+    def _image_urls(images: List[Dict]) -> Dict[str, Optional[str]]:
+        """Map the images API response to {'front': url, 'back': url}
+        
+        A side the response has no image for maps to None, so it is recorded
+        as unavailable rather than fetched again on every attempt.
+        """
+        urls = {side: None for side in SIDES}
+        for image in images:
+            if image.get('ImageURL'):
+                urls['front' if image.get('IsFrontImage') else 'back'] = image['ImageURL']
+        return urls
+    
     def process_cert(self, cert_number: str) -> Tuple[bool, Optional[Dict]]:
-        """Process a single certificate"""
-        self._log_debug(f"Processing certificate {cert_number}")
+        """Process a single certificate, logging its timing summary"""
+        with self._metrics_lock:
+            self._metrics[cert_number] = {}
+        started = time.perf_counter()
+        success = False
+        try:
+            success, details = self._process_cert_stages(cert_number)
+            return success, details
+        finally:
+            with self._metrics_lock:
+                metrics = self._metrics.pop(cert_number, {})
+            logger.info("Processed certificate %s", cert_number, extra={
+                "cert_number": cert_number,
+                "success": success,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                "api_calls": metrics.get("api_calls", 0),
+                "api_ms": round(metrics.get("api_ms", 0), 1),
+                "cache_hits": metrics.get("cache_hits", 0),
+                "download_ms": round(metrics.get("download_ms", 0), 1),
+                "download_bytes": metrics.get("download_bytes", 0)
+            })
+    
+    def _process_cert_stages(self, cert_number: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Process a single certificate, doing only the stages still missing
         
-        # Check if already processed
-        if self.is_cert_complete(cert_number):
-            self._log_debug(f"Certificate {cert_number} already completely processed")
-            slab = self.db.get_slab_by_cert(cert_number)
-            return True, slab
+        Stages are details fetched, image URLs fetched, front downloaded and
+        back downloaded. Finished stages are read from CertStageStore, so a
+        rerun after a failed download reuses the cached details and image
+        URLs and spends no API calls.
+        """
+        stages = self.stages.get(cert_number)
+        if stages.complete:
+            logger.debug("Certificate %s already completely processed", cert_number,
+                         extra={"cert_number": cert_number})
+            return True, stages.details
         
-        # Create cert directory
+        # The cert directory is created by the downloader once an image arrives
         cert_dir = os.path.join(self.image_dir, cert_number)
-        os.makedirs(cert_dir, exist_ok=True)
+        
+        # Fetch image metadata while the details call is in flight
+        missing_sides = stages.missing_sides
+        images_future = None
+        if missing_sides and stages.image_urls is None:
+            images_future = self._io_pool.submit(self.get_cert_images, cert_number)
         
         # Get and save details
-        details = self.get_cert_details(cert_number)
-        if details:
-            # Save to database
-            self.db.save_slab_details(details, cert_dir)
+        details = stages.details
+        if details is None:
+            details = self.get_cert_details(cert_number)
+            if details:
+                # Save to database first: once the stage is recorded the details are never fetched again
+                self.db.save_slab_details(details, cert_dir)
+                self.stages.save_details(cert_number, details)
         
-        # Get and save images
-        images = self.get_cert_images(cert_number)
-        success = False
-        if images:
-            success = True
-            for image in images:
-                if image.get('ImageURL'):
-                    suffix = 'front' if image.get('IsFrontImage') else 'back'
-                    image_path = os.path.join(cert_dir, f'{cert_number}_{suffix}.jpg')
-                    if not self.download_image(image.get('ImageURL'), image_path):
-                        success = False
+        image_urls = stages.image_urls
+        urls_cached = image_urls is not None
+        if images_future is not None:
+            images = images_future.result()
+            urls = self._image_urls(images or [])
+            # A response without any image means PSA has not imaged the slab yet; ask again next time
+            if any(urls.values()):
+                image_urls = urls
+                self.stages.save_image_urls(cert_number, image_urls)
+                missing_sides = [side for side in missing_sides if not unavailable_side(image_urls, side)]
+                for side in SIDES:
+                    if unavailable_side(image_urls, side):
+                        logger.warning("PSA has no %s image for certificate %s", side, cert_number,
+                                       extra={"cert_number": cert_number})
+        
+        # Download the missing sides in parallel
+        downloads = {}
+        for side in missing_sides:
+            if image_urls and image_urls.get(side):
+                image_path = os.path.join(cert_dir, f'{cert_number}_{side}.jpg')
+                downloads[side] = (image_path, self._io_pool.submit(self.download_image, image_urls[side], image_path, cert_number))
+        
+        downloaded = 0
+        for side, (image_path, download) in downloads.items():
+            if download.result():
+                self.stages.mark_downloaded(cert_number, side, image_path)
+                self.db.save_slab_image(cert_number, side, image_path)
+                self.derivatives.submit(image_path)
+                downloaded += 1
         
-        return success and bool(details), details
+        images_done = downloaded == len(missing_sides)
+        if not images_done and urls_cached:
+            # Cached URLs may have expired; fetch fresh ones on the next attempt
+            self.stages.clear_image_urls(cert_number)
+            self.response_cache.invalidate('cert_images', cert_number)
+        
+        return images_done and bool(details), details
     
-    def process_submission_file(self, file_path: str) -> Dict:
-        """Process a PSA submission file"""
-        self._log_debug(f"Processing submission file: {file_path}")
+    def process_submission_file(self, file_path: str, max_workers: Optional[int] = None) -> Dict:
+        """Queue a PSA submission file and process as much of the queue as today's quota allows"""
+        logger.info("Processing submission file: %s", file_path)
         
         results = {
             "processed": 0,
@@ -179,43 +334,41 @@ class PSAProcessor:
         with open(file_path, 'r') as src, open(import_path, 'w') as dst:
             dst.write(src.read())
         
-        with open(file_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                cert_number = row.get('PSA SUBMISSION NUMBER', '').strip()
-                if not cert_number:
-                    results["skipped"] += 1
-                    continue
-                
-                # Check if already processed
-                if self.is_cert_complete(cert_number):
-                    results["already_complete"] += 1
-                    continue
-                
-                # Check API call limit
-                if self.api_tracker.get_calls_remaining() < 2:
-                    break
-                
-                success, details = self.process_cert(cert_number)
-                if success:
-                    results["processed"] += 1
-                    results["details"].append({
-                        "cert_number": cert_number,
-                        "details": details
-                    })
-                else:
-                    results["failed"] += 1
-                
-                time.sleep(1)  # Rate limiting
+        jobs, results["skipped"] = read_submission_jobs(file_path)
+        pending = []
+        for cert_number, priority in jobs:
+            if self.is_cert_complete(cert_number):
+                results["already_complete"] += 1
+            else:
+                pending.append((cert_number, priority))
+        self.queue.enqueue_many(pending)
         
+        drained = self.process_queue(max_workers)
+        results["processed"] = drained["processed"]
+        results["failed"] = drained["failed"]
+        results["details"] = drained["details"]
+        results["queued"] = self.queue.stats()["pending"]
         return results
     
+    def process_queue(self, max_workers: Optional[int] = None) -> Dict:
+        """Process queued certs, highest priority first, until the queue or today's quota runs out"""
+        if not self.worker.is_running:
+            # Jobs still marked running were interrupted by a crash or restart
+            self.queue.requeue_running()
+        return self.worker.drain(max_workers)
+    
+    def start_worker(self):
+        """Drain the queue in the background, resuming after each daily quota reset"""
+        return self.worker.start()
+    
     def get_processing_stats(self) -> Dict:
         """Get current processing statistics"""
+        slabs = self.db.get_slab_stats()
         return {
-            "total_slabs": self.db.get_slab_count(),
-            "complete_slabs": self.db.get_complete_slab_count(),
-            "incomplete_slabs": self.db.get_incomplete_slab_count(),
+            "total_slabs": slabs["total"],
+            "complete_slabs": slabs["complete"],
+            "incomplete_slabs": slabs["incomplete"],
             "api_calls_remaining": self.api_tracker.get_calls_remaining(),
+            "queue": self.queue.stats(),
             "pending_certs": self.db.get_pending_cert_numbers()
         }
\ No newline at end of file
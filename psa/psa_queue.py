@@ -0,0 +1,257 @@
+"""
+Persistent, prioritized work queue for PSA cert processing
+"""
+
+import csv
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from database.inventory_db import InventoryDB
+from psa.rate_limiter import QuotaExhaustedError
+
+class PSAWorkQueue:
+    """Durable queue of PSA tasks stored in the psa_jobs table
+
+    Jobs are unique per (cert_number, task), so enqueueing a submission file
+    twice never schedules duplicate API calls. Jobs are claimed highest
+    priority first; a failed job is retried with exponential backoff until
+    max_attempts, after which it is dead-lettered with its last error.
+    Jobs interrupted by a crash are returned to pending by requeue_running().
+    """
+
+    def __init__(self, db: InventoryDB, max_attempts: int = 5):
+        self.db = db
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def grade_priority(grade: str) -> int:
+        """Priority for a submission row, e.g. "PSA 10" -> 10"""
+        match = re.search(r'(\d+(?:\.\d+)?)', grade or '')
+        return int(float(match.group(1))) if match else 0
+
+    def enqueue(self, cert_number: str, priority: int = 0, task: str = 'cert') -> None:
+        """Add a job, or raise the priority of one that is still outstanding"""
+        with self.db.conn:
+            self.db.conn.execute('''
+                INSERT INTO psa_jobs (cert_number, task, priority, max_attempts)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (cert_number, task) DO UPDATE SET
+                    priority = MAX(priority, excluded.priority),
+                    updated_at = datetime('now')
+                WHERE status IN ('pending', 'running')
+            ''', (cert_number, task, priority, self.max_attempts))
+
+    def enqueue_many(self, jobs: List[tuple], task: str = 'cert') -> None:
+        """Enqueue (cert_number, priority) pairs in one transaction"""
+        with self.db.conn:
+            self.db.conn.executemany('''
+                INSERT INTO psa_jobs (cert_number, task, priority, max_attempts)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (cert_number, task) DO UPDATE SET
+                    priority = MAX(priority, excluded.priority),
+                    updated_at = datetime('now')
+                WHERE status IN ('pending', 'running')
+            ''', [(cert, task, priority, self.max_attempts) for cert, priority in jobs])
+
+    def claim(self, limit: int, task: str = 'cert') -> List[Dict]:
+        """Mark up to limit due jobs as running and return them, highest priority first"""
+        conn = self.db.conn
+        if limit <= 0:
+            return []
+        # Take the write lock up front so concurrent workers never claim the same job
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('''
+                SELECT id, cert_number, task, priority, attempts
+                FROM psa_jobs
+                WHERE status = 'pending' AND task = ? AND not_before <= datetime('now')
+                ORDER BY priority DESC, id
+                LIMIT ?
+            ''', (task, limit)).fetchall()
+            conn.executemany('''
+                UPDATE psa_jobs
+                SET status = 'running', attempts = attempts + 1, updated_at = datetime('now')
+                WHERE id = ?
+            ''', [(row['id'],) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [dict(row, attempts=row['attempts'] + 1) for row in rows]
+
+    def complete(self, job_id: int) -> None:
+        """Mark a job as done"""
+        with self.db.conn:
+            self.db.conn.execute('''
+                UPDATE psa_jobs SET status = 'done', last_error = NULL, updated_at = datetime('now')
+                WHERE id = ?
+            ''', (job_id,))
+
+    def fail(self, job_id: int, error: str) -> None:
+        """Schedule a retry with backoff, or dead-letter the job once it runs out of attempts"""
+        with self.db.conn:
+            self.db.conn.execute('''
+                UPDATE psa_jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+                    last_error = ?,
+                    not_before = datetime('now', '+' || MIN(3600, 60 * (1 << attempts)) || ' seconds'),
+                    updated_at = datetime('now')
+                WHERE id = ?
+            ''', (error, job_id))
+
+    def release(self, job_id: int) -> None:
+        """Return a job to pending without using up an attempt, e.g. when the quota ran out"""
+        with self.db.conn:
+            self.db.conn.execute('''
+                UPDATE psa_jobs
+                SET status = 'pending', attempts = MAX(0, attempts - 1), updated_at = datetime('now')
+                WHERE id = ?
+            ''', (job_id,))
+
+    def requeue_running(self) -> int:
+        """Return jobs left running by a crashed worker to pending"""
+        with self.db.conn:
+            cursor = self.db.conn.execute('''
+                UPDATE psa_jobs SET status = 'pending', updated_at = datetime('now')
+                WHERE status = 'running'
+            ''')
+            return cursor.rowcount
+
+    def retry_dead(self) -> int:
+        """Give dead-lettered jobs a fresh set of attempts"""
+        with self.db.conn:
+            cursor = self.db.conn.execute('''
+                UPDATE psa_jobs
+                SET status = 'pending', attempts = 0, not_before = datetime('now'),
+                    updated_at = datetime('now')
+                WHERE status = 'dead'
+            ''')
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        counts = {"pending": 0, "running": 0, "done": 0, "dead": 0}
+        for row in self.db.conn.execute('SELECT status, COUNT(*) FROM psa_jobs GROUP BY status'):
+            counts[row[0]] = row[1]
+        return counts
+
+    def dead_jobs(self) -> List[Dict]:
+        """Dead-lettered jobs with their last error"""
+        return [dict(row) for row in self.db.conn.execute('''
+            SELECT cert_number, task, attempts, last_error, updated_at
+            FROM psa_jobs WHERE status = 'dead' ORDER BY updated_at
+        ''')]
+
+class PSAQueueWorker:
+    """Drain the PSA work queue as the daily API quota allows
+
+    Each cert costs two API calls. drain() processes due jobs until the queue
+    is empty or today's quota is spent; run() repeats that in the background,
+    sleeping until psa_api.reset_hour (UTC) whenever the quota is exhausted.
+    """
+
+    CALLS_PER_CERT = 2
+
+    def __init__(self, processor: 'PSAProcessor', queue: PSAWorkQueue, poll_interval: float = 60.0):
+        self.processor = processor
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.reset_hour = int(processor.config.config.get("psa_api", {}).get("reset_hour", 0))
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def seconds_until_reset(self) -> float:
+        """Seconds until the next daily quota reset"""
+        now = datetime.now(timezone.utc)
+        reset = now.replace(hour=self.reset_hour, minute=0, second=0, microsecond=0)
+        if reset <= now:
+            reset += timedelta(days=1)
+        return (reset - now).total_seconds()
+
+    def _run_job(self, job: Dict) -> tuple:
+        cert_number = job['cert_number']
+        try:
+            success, details = self.processor.process_cert(cert_number)
+        except QuotaExhaustedError:
+            self.queue.release(job['id'])
+            return 'deferred', cert_number, None
+        except Exception as e:
+            self.queue.fail(job['id'], str(e))
+            return 'failed', cert_number, None
+        if success:
+            self.queue.complete(job['id'])
+            return 'processed', cert_number, details
+        self.queue.fail(job['id'], "Incomplete details or images")
+        return 'failed', cert_number, None
+
+    def drain(self, max_workers: Optional[int] = None) -> Dict:
+        """Process due jobs until the queue is empty or today's quota is spent"""
+        results = {
+            "processed": 0,
+            "failed": 0,
+            "deferred": 0,
+            "details": []
+        }
+        workers = max_workers or self.processor.max_workers
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='psa-cert') as pool:
+            while not self._stop.is_set():
+                budget = self.processor.api_tracker.get_calls_remaining() // self.CALLS_PER_CERT
+                jobs = self.queue.claim(min(workers, budget))
+                if not jobs:
+                    break
+                futures = [pool.submit(self._run_job, job) for job in jobs]
+                for future in as_completed(futures):
+                    outcome, cert_number, details = future.result()
+                    results[outcome] += 1
+                    if outcome == 'processed':
+                        results["details"].append({
+                            "cert_number": cert_number,
+                            "details": details
+                        })
+                if results["deferred"]:
+                    break
+        return results
+
+    def run(self):
+        """Drain the queue until stopped, waiting out quota resets"""
+        self.queue.requeue_running()
+        while not self._stop.is_set():
+            self.drain()
+            if self.processor.api_tracker.get_calls_remaining() < self.CALLS_PER_CERT:
+                self._stop.wait(self.seconds_until_reset())
+            else:
+                self._stop.wait(self.poll_interval)
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the background thread is active"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> threading.Thread:
+        """Run the worker on a background daemon thread"""
+        if not self.is_running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='psa-queue', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the worker to stop after the current batch"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def read_submission_jobs(file_path: str) -> tuple:
+    """Read (cert_number, priority) pairs from a submission CSV; returns (jobs, skipped)"""
+    jobs = []
+    skipped = 0
+    with open(file_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            cert_number = (row.get('PSA SUBMISSION NUMBER') or '').strip()
+            if not cert_number:
+                skipped += 1
+                continue
+            jobs.append((cert_number, PSAWorkQueue.grade_priority(row.get('GRADE', ''))))
+    return jobs, skipped
@@ -0,0 +1,129 @@
+"""
+Rate limiting and daily quota enforcement for outbound PSA calls
+"""
+
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+import requests
+from config.config import Config
+from psa.psa_api_tracker import PSAApiTracker
+
+logger = logging.getLogger(__name__)
+
+class QuotaExhaustedError(Exception):
+    """Raised when today's PSA API quota has been used up"""
+
+class TokenBucket:
+    """Token bucket allowing short bursts on top of a sustained rate"""
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a token is available and take it; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for a while, e.g. after a 429 response"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated = now
+
+class PSARateLimiter:
+    """Shared gate for PSA requests: token bucket, retry/backoff and daily quota
+
+    API calls take a token from the bucket and reserve one unit of today's
+    quota from PSAApiTracker before they are sent, so concurrent workers can
+    never exceed the daily limit. Responses with 429 or 5xx status are retried
+    after the server's Retry-After delay, or with exponential backoff; a 429
+    on an API call pauses the bucket for every worker. When an API call fails
+    to connect, its quota unit is refunded before the error is raised, since
+    the request never reached PSA.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, config: Config, api_tracker: PSAApiTracker):
+        psa_config = config.config.get("psa_api", {})
+        limits = psa_config.get("rate_limit", {})
+        self.bucket = TokenBucket(float(limits.get("rate", 1.0)), int(limits.get("burst", 5)))
+        self.max_retries = int(psa_config.get("max_retries", 3))
+        self.backoff_base = float(psa_config.get("backoff_base", 2.0))
+        self.backoff_max = float(psa_config.get("backoff_max", 60.0))
+        self.api_tracker = api_tracker
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Seconds to wait before retrying a throttled or failed response"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(retry_after)
+                    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def request(self, send: Callable[[], requests.Response],
+                cert_number: Optional[str] = None) -> requests.Response:
+        """Send a request with retries
+
+        When cert_number is given the request is a quota-counted API call;
+        otherwise (e.g. image downloads) only retry handling applies.
+        """
+        attempt = 0
+        while True:
+            if cert_number is not None:
+                self.bucket.acquire()
+                quota_date = self.api_tracker.try_record_api_call(cert_number)
+                if not quota_date:
+                    raise QuotaExhaustedError("Daily PSA API quota exhausted")
+
+            try:
+                response = send()
+            except requests.ConnectionError:
+                if cert_number is not None:
+                    self.api_tracker.refund_api_call(cert_number, quota_date)
+                raise
+            if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            response.close()  # free the connection of a streamed response before retrying
+            logger.debug("Retrying after %d response in %.1fs", response.status_code, delay,
+                         extra={"cert_number": cert_number, "status": response.status_code,
+                                "attempt": attempt + 1, "retry_delay_s": round(delay, 2)})
+            if response.status_code == 429 and cert_number is not None:
+                # Hold back every worker; the next acquire() waits out the pause
+                self.bucket.pause(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,80 @@
+"""
+On-disk cache for PSA API responses
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+from typing import Any, Dict, Optional
+
+class PSAResponseCache:
+    """Content-addressed cache of PSA API responses with per-endpoint TTLs
+
+    Each response is stored as gzip-compressed JSON in a file named after the
+    SHA-256 of "endpoint:key", fanned out into subdirectories by the first two
+    hex digits. Entries older than their endpoint's TTL are treated as
+    missing. A TTL of 0 disables caching for that endpoint.
+    """
+
+    def __init__(self, cache_dir: str, ttls: Dict[str, int]):
+        self.cache_dir = cache_dir
+        self.ttls = ttls
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, endpoint: str, key: str) -> str:
+        digest = hashlib.sha256(f"{endpoint}:{key}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json.gz")
+
+    def get(self, endpoint: str, key: str) -> Optional[Any]:
+        """Get a cached response, or None if missing or expired"""
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return None
+        path = self._path(endpoint, key)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # Missing, or corrupt from an interrupted write
+            return None
+        if entry.get("endpoint") != endpoint or entry.get("key") != key:
+            return None
+        return entry["data"]
+
+    def put(self, endpoint: str, key: str, data: Any):
+        """Store a response, replacing any previous entry atomically"""
+        if self.ttls.get(endpoint, 0) <= 0:
+            return
+        path = self._path(endpoint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({"endpoint": endpoint, "key": key, "fetched_at": time.time(), "data": data}, f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def invalidate(self, endpoint: str, key: str) -> bool:
+        """Drop one cached response; returns whether it existed"""
+        try:
+            os.remove(self._path(endpoint, key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def invalidate_key(self, key: str) -> int:
+        """Drop the cached responses of every endpoint for a key, e.g. a cert number"""
+        return sum(self.invalidate(endpoint, key) for endpoint in self.ttls)
+
+    def clear(self) -> int:
+        """Drop every cached response"""
+        removed = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
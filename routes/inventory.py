@@ -3,83 +3,135 @@ Inventory management routes
 """
 
 import os
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, make_response
 from database.inventory_manager import InventoryManager
 
 inventory_bp = Blueprint('inventory', __name__)
 manager = InventoryManager(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'))
 
+# Rendered overview page for the inventory version it was rendered from
+_index_cache = {"version": None, "html": None}
+
 @inventory_bp.route('/')
 def index():
     """Display inventory overview"""
-    opened_sets = manager.inventory["opened"]["sets"]
-    stashed_sets = manager.inventory["stashed"]["sets"]
-    
-    # Calculate totals
-    opened_totals = {
-        "boxes": sum(s["boxes"]["purchased"] for s in opened_sets.values()),
-        "packs": sum(s["packs"]["total"] for s in opened_sets.values()),
-        "slabs": sum(s["slabs"]["total"] for s in opened_sets.values() if "slabs" in s)
-    }
-    
-    stashed_totals = {
-        "cases": sum(s["cases"]["total"] for s in stashed_sets.values()),
-        "boxes": sum(s["total_boxes_stashed"] for s in stashed_sets.values())
+    global _index_cache
+    with manager.reading():
+        version = (manager.generation, manager.version)
+        etag = "inventory-%s-%s" % version
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        cache = _index_cache
+        if cache["version"] != version:
+            cache = {
+                "version": version,
+                "html": render_template('inventory.html',
+                                        set_names=manager.set_names,
+                                        **manager.get_dashboard())
+            }
+            _index_cache = cache
+
+    response = make_response(cache["html"])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _add_box(data: dict) -> dict:
+    """Add a box from a request payload"""
+    box_id = manager.add_box(
+        set_name=data['set_name'],
+        purchase_date=data['purchase_date'],
+        source=data['source'],
+        price=float(data['price']),
+        is_stashed=data.get('is_stashed', False),
+        case_id=data.get('case_id')
+    )
+    return {"box_id": box_id}
+
+def _add_case(data: dict) -> dict:
+    """Add a case from a request payload"""
+    case_id = manager.add_case(
+        set_name=data['set_name'],
+        purchase_date=data['purchase_date'],
+        source=data['source'],
+        price_per_box=float(data['price_per_box'])
+    )
+    return {"case_id": case_id}
+
+def _add_slab(data: dict) -> dict:
+    """Add a slab from a request payload"""
+    manager.add_slab(
+        cert_number=data['cert_number'],
+        set_name=data['set_name'],
+        status=data.get('status', 'imported'),
+        cert_details=data.get('cert_details')
+    )
+    return {}
+
+def _bulk(handler, items) -> dict:
+    """Apply a handler to each item in one batch and collect per-item results"""
+    if not isinstance(items, list):
+        return {"success": False, "error": "Expected a JSON array"}
+
+    results = []
+    with manager.batch():
+        for item in items:
+            try:
+                results.append({"success": True, **handler(item)})
+            except Exception as e:
+                results.append({"success": False, "error": str(e)})
+    return {
+        "success": all(r["success"] for r in results),
+        "added": sum(1 for r in results if r["success"]),
+        "results": results
     }
-    
-    return render_template('inventory.html',
-                         opened_sets=opened_sets,
-                         stashed_sets=stashed_sets,
-                         opened_totals=opened_totals,
-                         stashed_totals=stashed_totals)
 
 @inventory_bp.route('/api/box/add', methods=['POST'])
 def add_box():
     """Add a new box to inventory"""
     data = request.json
     try:
-        box_id = manager.add_box(
-            set_name=data['set_name'],
-            purchase_date=data['purchase_date'],
-            source=data['source'],
-            price=float(data['price']),
-            is_stashed=data.get('is_stashed', False),
-            case_id=data.get('case_id')
-        )
-        return jsonify({"success": True, "box_id": box_id})
+        return jsonify({"success": True, **_add_box(data)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@inventory_bp.route('/api/box/bulk', methods=['POST'])
+def add_boxes():
+    """Add many boxes to inventory with a single save"""
+    return jsonify(_bulk(_add_box, request.json))
+
 @inventory_bp.route('/api/case/add', methods=['POST'])
 def add_case():
     """Add a new case to inventory"""
     data = request.json
     try:
-        case_id = manager.add_case(
-            set_name=data['set_name'],
-            purchase_date=data['purchase_date'],
-            source=data['source'],
-            price_per_box=float(data['price_per_box'])
-        )
-        return jsonify({"success": True, "case_id": case_id})
+        return jsonify({"success": True, **_add_case(data)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@inventory_bp.route('/api/case/bulk', methods=['POST'])
+def add_cases():
+    """Add many cases to inventory with a single save"""
+    return jsonify(_bulk(_add_case, request.json))
+
 @inventory_bp.route('/api/slab/add', methods=['POST'])
 def add_slab():
     """Add a new slab to inventory"""
     data = request.json
     try:
-        manager.add_slab(
-            cert_number=data['cert_number'],
-            set_name=data['set_name'],
-            status=data.get('status', 'imported'),
-            cert_details=data.get('cert_details')
-        )
+        _add_slab(data)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@inventory_bp.route('/api/slab/bulk', methods=['POST'])
+def add_slabs():
+    """Add many slabs to inventory with a single save"""
+    return jsonify(_bulk(_add_slab, request.json))
+
 @inventory_bp.route('/api/slab/status', methods=['PUT'])
 def update_slab_status():
     """Update slab status"""
@@ -93,6 +145,15 @@ def update_slab_status():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@inventory_bp.route('/api/slab/status/bulk', methods=['PUT'])
+def update_slab_statuses():
+    """Update the status of many slabs with a single save"""
+    def update(data: dict) -> dict:
+        if not manager.update_slab_status(cert_number=data['cert_number'], new_status=data['status']):
+            raise ValueError(f"Slab {data['cert_number']} not found")
+        return {}
+    return jsonify(_bulk(update, request.json))
+
 @inventory_bp.route('/api/sequential/add', methods=['POST'])
 def add_sequential():
     """Add a sequential set"""
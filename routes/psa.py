@@ -0,0 +1,49 @@
+"""
+PSA slab image routes
+"""
+
+import os
+import threading
+from flask import Blueprint, abort, request, send_file, url_for
+from config.config import Config
+from psa.derivatives import DERIVATIVES, SIDES, DerivativeStore
+
+psa_bp = Blueprint('psa', __name__)
+_derivatives = None
+_derivatives_lock = threading.Lock()
+
+# Derivative URLs carry the file hash, so a response can be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def get_derivatives() -> DerivativeStore:
+    """The derivative store, created on first use so importing the blueprint has no side effects"""
+    global _derivatives
+    with _derivatives_lock:
+        if _derivatives is None:
+            _derivatives = DerivativeStore(os.path.join(Config().data_dir, 'psa', 'images'))
+        return _derivatives
+
+@psa_bp.app_template_global()
+def slab_image_url(cert_number: str, side: str = 'front', variant: str = 'thumb') -> str:
+    """URL of a slab image derivative, versioned by its hash"""
+    entry = get_derivatives().lookup(cert_number, side, variant)
+    version = entry["sha256"][:16] if entry else None
+    return url_for('psa.slab_image', cert_number=cert_number, side=side, variant=variant, v=version)
+
+@psa_bp.route('/images/<cert_number>/<side>/<variant>.jpg')
+def slab_image(cert_number, side, variant):
+    """Serve a slab image derivative"""
+    if side not in SIDES or variant not in DERIVATIVES:
+        abort(404)
+    entry = get_derivatives().lookup(cert_number, side, variant)
+    if entry is None or not os.path.exists(entry["path"]):
+        abort(404)
+
+    response = send_file(entry["path"], mimetype='image/jpeg', etag=entry["sha256"],
+                         conditional=True)
+    if request.args.get('v') == entry["sha256"][:16]:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        # Unversioned URL: allow caching but revalidate against the ETag
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
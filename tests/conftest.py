@@ -0,0 +1,33 @@
+"""
+Shared fixtures for the test suite
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory holding only the sets reference data"""
+    os.makedirs(tmp_path / 'data')
+    shutil.copy(os.path.join(ROOT, 'data', 'pokemon_sets.json'), tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def db(workdir):
+    """A fresh InventoryDB in the working directory"""
+    from database.inventory_db import InventoryDB
+    inventory = InventoryDB(str(workdir / 'data' / 'inventory.db'))
+    yield inventory
+    inventory.pool.close()
+
+def write_csv(path, lines):
+    """Write lines to a CSV file and return its path as a string"""
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
@@ -0,0 +1,57 @@
+"""
+Tests for database.booster_imports
+"""
+
+from conftest import write_csv
+from database.booster_imports import import_booster_purchases
+
+HEADER = ("Source,Purchase Date,Boxes Purchased,Business Boxes,Stashed Boxes,"
+          "Per Box USD,Total,Set,Packs Per Box,Business Packs")
+
+def box_counts(db):
+    return (db.conn.execute('SELECT COUNT(*) FROM business_boxes').fetchone()[0],
+            db.conn.execute('SELECT COUNT(*) FROM stashed_boxes').fetchone()[0])
+
+def test_reimport_skips_known_rows(db, workdir):
+    path = write_csv(workdir / 'boxes.csv', [
+        HEADER,
+        'Swivel,2025-02-07,2,2,0,$38.00,$76.00,Mask of Change,30,60',
+        'Swivel,2025-02-08,3,1,2,"$1,038.00",$3114.00,Mask of Change,30,30'
+    ])
+    assert import_booster_purchases(db, path)[0]
+    success, _, duplicates = import_booster_purchases(db, path)
+    assert success
+    assert len(duplicates) == 2
+    assert box_counts(db) == (3, 2)
+
+def test_first_delta_import_adopts_boxes_from_before_keys(db, workdir):
+    # Boxes loaded by the importer before booster_purchases existed
+    with db.conn:
+        db.conn.executemany('''
+            INSERT INTO business_boxes (set_name, purchase_date, source, price, packs_opened, packs_sold)
+            VALUES ('Mask of Change', '2025-02-07', 'Swivel', 38.0, ?, 0)
+        ''', [(5,), (0,)])
+    path = write_csv(workdir / 'boxes.csv', [
+        HEADER,
+        'Swivel,2025-02-07,2,2,0,$38.00,$76.00,Mask of Change,30,60',
+        'Swivel,2025-03-01,1,0,1,$40.00,$40.00,Mask of Change,30,0'
+    ])
+
+    assert import_booster_purchases(db, path)[0]
+    assert box_counts(db) == (2, 1)
+    assert db.conn.execute('SELECT SUM(packs_opened) FROM business_boxes').fetchone()[0] == 5
+    assert db.conn.execute('SELECT COUNT(*) FROM booster_purchases').fetchone()[0] == 2
+    totals = db.conn.execute("SELECT business_boxes FROM set_totals WHERE set_name = 'Mask of Change'").fetchone()
+    assert totals[0] == 2
+
+    assert import_booster_purchases(db, path)[0]
+    assert box_counts(db) == (2, 1)
+
+def test_rejects_mismatched_totals(db, workdir):
+    path = write_csv(workdir / 'boxes.csv', [
+        HEADER,
+        'Swivel,2025-02-07,3,2,0,$38.00,$76.00,Mask of Change,30,60',
+        'Swivel,not a date,2,2,0,$38.00,$76.00,Mask of Change,30,60'
+    ])
+    assert import_booster_purchases(db, path)[0]
+    assert box_counts(db) == (0, 0)
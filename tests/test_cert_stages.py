@@ -0,0 +1,31 @@
+"""
+Tests for psa.cert_stages
+"""
+
+from psa.cert_stages import CertStageStore
+
+def test_side_without_image_does_not_block_completion(db, workdir):
+    store = CertStageStore(db)
+    front = workdir / '1_front.jpg'
+    front.write_bytes(b'\xff\xd8\xff')
+    store.save_details('1', {"PSACert": {"CertNumber": "1"}})
+    store.save_image_urls('1', {"front": "https://example.com/1_front.jpg", "back": None})
+    store.mark_downloaded('1', 'front', str(front))
+
+    stages = store.get('1')
+    assert stages.unavailable('back')
+    assert stages.missing_sides == []
+    assert stages.complete
+    assert stages.api_calls_needed == 0
+
+def test_missing_download_is_still_pending(db, workdir):
+    store = CertStageStore(db)
+    store.save_details('2', {"PSACert": {"CertNumber": "2"}})
+    store.save_image_urls('2', {"front": "https://example.com/f.jpg", "back": "https://example.com/b.jpg"})
+
+    stages = store.get('2')
+    assert stages.missing_sides == ['front', 'back']
+    assert not stages.complete
+
+    store.clear_image_urls('2')
+    assert store.get('2').api_calls_needed == 1
@@ -0,0 +1,58 @@
+"""
+Tests for database.csv_ingest
+"""
+
+import pytest
+
+from conftest import write_csv
+from database.csv_ingest import (Column, CoercionError, Schema, ingest, parse_currency, parse_date,
+                                 parse_grade, parse_int)
+
+@pytest.mark.parametrize('value, expected', [
+    ('38', 38.0), ('$38.00', 38.0), ('$1,234.50', 1234.5), ('($2.00)', -2.0), ('USD 4.99', 4.99),
+])
+def test_parse_currency(value, expected):
+    assert parse_currency(value) == expected
+
+@pytest.mark.parametrize('value', ['2025-04-18', '04/18/2025', 'Apr 18, 2025', '18-Apr-25'])
+def test_parse_date(value):
+    assert parse_date(value) == '2025-04-18'
+
+@pytest.mark.parametrize('value, expected', [
+    ('PSA 10', 10), ('GEM MT 10', 10), ('9', 9), ('NM-MT 8', 8), ('NM-MT 8.5', 8.5), ('PSA 9.0', 9),
+])
+def test_parse_grade(value, expected):
+    grade = parse_grade(value)
+    assert grade == expected and type(grade) is type(expected)
+
+@pytest.mark.parametrize('parse, value', [
+    (parse_grade, '11'), (parse_grade, '8.3'), (parse_grade, 'AUTHENTIC'), (parse_int, 'two'),
+    (parse_currency, 'free'), (parse_date, '2025-13-01'),
+])
+def test_parsers_reject_bad_values(parse, value):
+    with pytest.raises(CoercionError):
+        parse(value)
+
+def test_ingest_handles_quotes_aliases_and_rejects_rows(workdir):
+    schema = Schema([
+        Column('set_name'),
+        Column('quantity', parse_int),
+        Column('price', parse_currency, aliases=['sale price']),
+        Column('note', required=False, default=''),
+    ])
+    path = write_csv(workdir / 'rows.csv', [
+        'Set Name,Quantity,"Sale Price"',
+        '"Pokemon Japanese SV9-Battle Partners, Booster Box",2,"$1,234.50"',
+        '',
+        'Mask of Change,two,$3.00',
+        'Mask of Change,1,',
+    ])
+    batches = []
+    report = ingest(path, schema, batches.append)
+
+    records = [record for batch in batches for record in batch]
+    assert [r.values for r in records] == [
+        ('Pokemon Japanese SV9-Battle Partners, Booster Box', 2, 1234.5, ''),
+    ]
+    assert (report.rows_read, report.rows_accepted, report.rows_rejected) == (3, 1, 2)
+    assert [(e.line, e.column) for e in report.errors] == [(4, 'quantity'), (5, 'price')]
@@ -0,0 +1,76 @@
+"""
+Tests for database.ebay_imports
+"""
+
+from conftest import write_csv
+from database.ebay_imports import backfill_sale_keys, import_ebay_sales, sale_row_key
+
+HEADER = 'set_name,quantity,sale_price,shipping_charged,shipping_cost,ebay_fees,date'
+
+def sale_count(db):
+    return db.conn.execute('SELECT COUNT(*) FROM pack_sales').fetchone()[0]
+
+def test_sale_row_key_counts_occurrences():
+    seen = {}
+    values = ('Mask of Change', 1, 10.0, 1.0, 0.5, 0.25, '2025-04-18')
+    first, second = sale_row_key(values, None, seen), sale_row_key(values, None, seen)
+    assert first.startswith('sha1:') and first.endswith(':1') and second.endswith(':2')
+    assert sale_row_key(values, 'A-1', seen) == 'order:A-1:1'
+    assert sale_row_key(values, None, {}) == first
+
+def test_overlapping_exports_import_each_sale_once(db, workdir):
+    first = write_csv(workdir / 'first.csv', [
+        HEADER,
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18',
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18',
+    ])
+    second = write_csv(workdir / 'second.csv', [
+        HEADER,
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18',
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18',
+        'Mask of Change,2,18.00,1.00,0.50,0.40,2025-04-19',
+    ])
+    assert import_ebay_sales(db, first)
+    assert import_ebay_sales(db, second)
+    assert import_ebay_sales(db, second)
+    assert sale_count(db) == 3
+
+def test_unchanged_file_is_skipped(db, workdir, capsys):
+    path = write_csv(workdir / 'sales.csv', [HEADER, 'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18'])
+    import_ebay_sales(db, path)
+    import_ebay_sales(db, path)
+    assert 'already imported' in capsys.readouterr().out
+    assert sale_count(db) == 1
+
+def test_legacy_rows_match_export_with_order_ids(db, workdir):
+    with db.conn:
+        db.conn.executemany('''
+            INSERT INTO pack_sales (set_name, quantity, sale_price, shipping_charged,
+                                    shipping_cost, ebay_fees, sale_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [('Mask of Change', 1, 10.0, 1.0, 0.5, 0.25, '2025-04-18')] * 2)
+    assert backfill_sale_keys(db) == 2
+
+    path = write_csv(workdir / 'orders.csv', [
+        HEADER + ',Order Number',
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18,11-001',
+        'Mask of Change,1,10.00,1.00,0.50,0.25,2025-04-18,11-002',
+        'Mask of Change,1,12.00,1.00,0.50,0.30,2025-04-20,11-003',
+    ])
+    assert import_ebay_sales(db, path)
+    assert sale_count(db) == 3
+    keys = {row[0] for row in db.conn.execute('SELECT row_key FROM pack_sales')}
+    assert keys == {'order:11-001:1', 'order:11-002:1', 'order:11-003:1'}
+
+def test_legacy_rows_with_csv_set_names_are_not_reimported(db, workdir):
+    raw_name = 'Pokemon Japanese SV9-Battle Partners'
+    with db.conn:
+        db.conn.execute('''
+            INSERT INTO pack_sales (set_name, quantity, sale_price, shipping_charged,
+                                    shipping_cost, ebay_fees, sale_date)
+            VALUES (?, 2, 15.99, 4.99, 3.50, 2.50, '2025-04-18')
+        ''', (raw_name,))
+
+    path = write_csv(workdir / 'sales.csv', [HEADER, f'{raw_name},2,15.99,4.99,3.50,2.50,2025-04-18'])
+    assert import_ebay_sales(db, path)
+    assert sale_count(db) == 1
@@ -0,0 +1,76 @@
+"""
+Tests for database.inventory_db
+"""
+
+import pytest
+
+def add_box(db, set_name, price):
+    with db.conn:
+        return db.conn.execute('''
+            INSERT INTO business_boxes (set_name, purchase_date, source, price) VALUES (?, '2025-01-01', 'Shop', ?)
+        ''', (set_name, price)).lastrowid
+
+def set_row(db, set_name):
+    return next(row for row in db.get_sets_by_series() if row['name'] == set_name)
+
+def test_average_box_price_ignores_unpriced_boxes(db):
+    add_box(db, 'Mask of Change', 40.0)
+    unpriced = add_box(db, 'Mask of Change', None)
+    add_box(db, 'Mask of Change', 50.0)
+    row = set_row(db, 'Mask of Change')
+    assert (row['business_boxes'], row['avg_box_price']) == (3, 45.0)
+
+    with db.conn:
+        db.conn.execute('UPDATE business_boxes SET price = 60 WHERE id = ?', (unpriced,))
+    assert set_row(db, 'Mask of Change')['avg_box_price'] == 50.0
+
+    with db.conn:
+        db.conn.execute('DELETE FROM business_boxes WHERE price < 60')
+    row = set_row(db, 'Mask of Change')
+    assert (row['business_boxes'], row['avg_box_price']) == (1, 60.0)
+
+def add_slab(db, cert_number, status='Submitted'):
+    with db.conn:
+        db.conn.execute('''
+            INSERT INTO slabs (cert_number, set_name, card_number, card_name, grade, submission_date, status)
+            VALUES (?, 'Mask of Change', '001', 'Card', 10, '2025-01-01', ?)
+        ''', (cert_number, status))
+
+def test_save_slab_details_upserts_and_keeps_half_grades(db, workdir):
+    cert_dir = workdir / 'images'
+    cert_dir.mkdir()
+    (cert_dir / '100_front.jpg').write_bytes(b'\xff\xd8\xff')
+    add_slab(db, '100')
+
+    assert db.save_slab_details({"PSACert": {"CertNumber": "100", "CardGrade": "NM-MT 8.5",
+                                             "TotalPopulation": 42}}, str(cert_dir))
+    assert db.save_slab_details({"CertNumber": "200", "CardGrade": "GEM MT 10",
+                                 "Brand": "Pokemon Japanese Mask of Change"}, str(cert_dir))
+    assert not db.save_slab_details({"PSACert": {}}, str(cert_dir))
+
+    slabs = db.get_slabs_by_certs(['100', '200', '999'])
+    assert set(slabs) == {'100', '200'}
+    assert (slabs['100']['grade'], slabs['100']['psa_total_pop']) == (8.5, 42)
+    assert slabs['100']['front_image_path'] == str(cert_dir / '100_front.jpg')
+    assert slabs['100']['back_image_path'] is None
+    assert (slabs['200']['grade'], slabs['200']['set_name']) == (10, 'Mask of Change')
+
+def test_slab_stats_and_pending_pages(db, workdir):
+    for cert in ('300', '100', '200'):
+        add_slab(db, cert)
+    with db.conn:
+        db.conn.execute('''
+            UPDATE slabs SET psa_details_fetched = 1, front_image_path = 'f.jpg', back_image_path = 'b.jpg'
+            WHERE cert_number = '200'
+        ''')
+    assert db.save_slab_image('100', 'front', 'front.jpg')
+    assert not db.save_slab_image('999', 'front', 'front.jpg')
+    with pytest.raises(ValueError):
+        db.save_slab_image('100', 'side', 'side.jpg')
+
+    assert db.get_slab_stats() == {"total": 3, "complete": 1, "incomplete": 2}
+    assert db.get_slab_status_counts() == {"Submitted": {"total": 3, "complete": 1, "incomplete": 2}}
+    assert list(db.iter_pending_cert_numbers(batch_size=1)) == [['100'], ['300']]
+    assert db.get_pending_cert_numbers(limit=1) == ['100']
+    assert db.get_slab_by_cert('100')['front_image_path'] == 'front.jpg'
+    assert db.get_slab_by_cert('999') is None
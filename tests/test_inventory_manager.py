@@ -0,0 +1,44 @@
+"""
+Tests for database.inventory_manager
+"""
+
+import pytest
+
+from database.inventory_manager import InventoryManager
+
+@pytest.fixture
+def manager(workdir):
+    return InventoryManager(str(workdir / 'data'))
+
+def slab_status(manager, set_name, cert_number):
+    slabs = manager.inventory["opened"]["sets"][set_name]["slabs"]
+    item = next(s for s in slabs["items"] if s["cert_number"] == cert_number)
+    return item["status"], slabs["status"]
+
+def test_invalid_slab_status_leaves_inventory_unchanged(manager, workdir):
+    manager.add_slab('100', 'Mask of Change')
+    with pytest.raises(ValueError):
+        manager.update_slab_status('100', 'sold')
+
+    status, buckets = slab_status(manager, 'Mask of Change', '100')
+    assert status == 'imported' and buckets['imported'] == 1
+    assert slab_status(InventoryManager(str(workdir / 'data')), 'Mask of Change', '100')[0] == 'imported'
+
+def test_slab_status_update_survives_reload(manager, workdir):
+    manager.add_slab('100', 'Mask of Change')
+    assert manager.update_slab_status('100', 'listed')
+    assert manager.update_slab_status('999', 'listed') is False
+
+    status, buckets = slab_status(InventoryManager(str(workdir / 'data')), 'Mask of Change', '100')
+    assert status == 'listed' and (buckets['imported'], buckets['listed']) == (0, 1)
+
+def test_reinitialized_inventory_gets_new_generation(manager, workdir):
+    from database.initialize_inventory import initialize_inventory
+
+    manager.add_slab('100', 'Mask of Change')
+    before = (manager.generation, manager.version)
+    assert InventoryManager(str(workdir / 'data')).generation == before[0]
+
+    initialize_inventory()
+    with manager.reading():
+        assert manager.generation != before[0]
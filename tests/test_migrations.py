@@ -0,0 +1,70 @@
+"""
+Tests for database.migrations
+"""
+
+import sqlite3
+
+from database.inventory_db import InventoryDB
+from database.migrations import SCHEMA_VERSION, get_version, migrate
+
+# Layout written by the old init_db.py, before update_schema.py added ebay_fees
+LEGACY_SCHEMA = '''
+    CREATE TABLE sets (name TEXT PRIMARY KEY, code TEXT, series TEXT, packs_per_box INTEGER DEFAULT 30);
+    CREATE TABLE business_boxes (
+        id INTEGER PRIMARY KEY, set_name TEXT NOT NULL, purchase_date DATE NOT NULL,
+        source TEXT NOT NULL, price DECIMAL NOT NULL, packs_opened INTEGER DEFAULT 0,
+        packs_sold INTEGER DEFAULT 0
+    );
+    CREATE TABLE stashed_boxes (
+        id INTEGER PRIMARY KEY, set_name TEXT NOT NULL, purchase_date DATE NOT NULL,
+        source TEXT NOT NULL, price DECIMAL NOT NULL
+    );
+    CREATE TABLE pack_sales (
+        id INTEGER PRIMARY KEY, set_name TEXT NOT NULL, quantity INTEGER NOT NULL,
+        sale_price DECIMAL NOT NULL, shipping_charged DECIMAL NOT NULL,
+        shipping_cost DECIMAL NOT NULL, sale_date DATE NOT NULL
+    );
+    CREATE TABLE slabs (
+        id INTEGER PRIMARY KEY, cert_number TEXT UNIQUE NOT NULL, set_name TEXT NOT NULL,
+        card_number TEXT NOT NULL, card_name TEXT NOT NULL, grade INTEGER NOT NULL,
+        submission_date DATE NOT NULL, return_date DATE,
+        status TEXT CHECK(status IN ('Submitted', 'Ready', 'Listed', 'Sold', 'Stashed')),
+        psa_details_fetched BOOLEAN DEFAULT FALSE, psa_pop_higher INTEGER, psa_total_pop INTEGER,
+        psa_label_type TEXT, front_image_path TEXT, back_image_path TEXT, sale_price DECIMAL,
+        shipping_charged DECIMAL, shipping_cost DECIMAL, ebay_fees DECIMAL, sale_date DATE
+    );
+    CREATE TABLE psa_api_usage (id INTEGER PRIMARY KEY, date DATE UNIQUE NOT NULL, calls_made INTEGER DEFAULT 0);
+    INSERT INTO sets VALUES ('Mask of Change', 'SV6', 'Scarlet & Violet', 30);
+    INSERT INTO business_boxes (set_name, purchase_date, source, price) VALUES ('Mask of Change', '2025-01-02', 'Shop', 40);
+    INSERT INTO business_boxes (set_name, purchase_date, source, price) VALUES ('Mask of Change', '2025-01-02', 'Shop', 50);
+    INSERT INTO pack_sales (set_name, quantity, sale_price, shipping_charged, shipping_cost, sale_date)
+    VALUES ('Mask of Change', 2, 10, 1, 0.5, '2025-01-05');
+'''
+
+def test_legacy_database_is_upgraded(workdir):
+    path = str(workdir / 'data' / 'inventory.db')
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+    db = InventoryDB(path)
+    try:
+        assert get_version(db.conn) == SCHEMA_VERSION
+        sale = db.conn.execute('SELECT quantity, ebay_fees, row_key FROM pack_sales').fetchone()
+        assert tuple(sale) == (2, 0, None)
+        totals = db.conn.execute(
+            "SELECT business_boxes FROM set_totals WHERE set_name = 'Mask of Change'").fetchone()
+        assert totals[0] == 2
+    finally:
+        db.pool.close()
+
+def test_current_database_runs_no_ddl(workdir):
+    path = str(workdir / 'data' / 'inventory.db')
+    conn = sqlite3.connect(path)
+    assert migrate(conn) == SCHEMA_VERSION
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert migrate(conn) == SCHEMA_VERSION
+    conn.close()
+    assert statements == ['PRAGMA user_version']
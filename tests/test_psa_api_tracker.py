@@ -0,0 +1,54 @@
+"""
+Tests for psa.psa_api_tracker
+"""
+
+import json
+from types import SimpleNamespace
+
+from psa.psa_api_tracker import PSAApiTracker
+
+def make_tracker(db, workdir, daily_limit=2):
+    config = SimpleNamespace(config={"psa_api": {"daily_limit": daily_limit}},
+                             api_log_file=str(workdir / 'data' / 'psa_api_log.json'))
+    return PSAApiTracker(config, db)
+
+def test_quota_is_enforced_and_refunded(db, workdir):
+    tracker = make_tracker(db, workdir)
+    assert tracker.try_record_api_call('100')
+    date = tracker.try_record_api_call('101')
+    assert tracker.try_record_api_call('102') is None
+
+    tracker.refund_api_call('101', date)
+    assert tracker.get_calls_remaining() == 1
+    assert tracker.get_processed_certs() == ['100']
+    assert tracker.try_record_api_call('102')
+
+def test_refund_never_goes_below_zero(db, workdir):
+    tracker = make_tracker(db, workdir)
+    tracker.refund_api_call('100', tracker._get_current_date())
+    assert tracker.get_calls_remaining() == 2
+
+def test_json_log_is_imported_once_and_left_in_place(db, workdir):
+    log_file = workdir / 'data' / 'psa_api_log.json'
+    log_file.write_text(json.dumps({"daily_logs": {"2025-01-02": {"calls": 5}}}))
+    make_tracker(db, workdir)
+    count = "SELECT calls_made FROM psa_api_usage WHERE date = '2025-01-02'"
+    assert db.conn.execute(count).fetchone()[0] == 5
+
+    # Pruned days must not come back from the log on the next start
+    with db.conn:
+        db.conn.execute('DELETE FROM psa_api_usage')
+    make_tracker(db, workdir)
+    assert log_file.exists()
+    assert db.conn.execute(count).fetchone() is None
+
+def test_refund_goes_to_the_day_the_call_was_counted(db, workdir, monkeypatch):
+    tracker = make_tracker(db, workdir)
+    monkeypatch.setattr(tracker, '_get_current_date', lambda: '2025-01-01')
+    date = tracker.try_record_api_call('100')
+    monkeypatch.setattr(tracker, '_get_current_date', lambda: '2025-01-02')
+    assert tracker.try_record_api_call('101') == '2025-01-02'
+
+    tracker.refund_api_call('100', date)
+    usage = dict(db.conn.execute('SELECT date, calls_made FROM psa_api_usage').fetchall())
+    assert usage == {'2025-01-01': 0, '2025-01-02': 1}
@@ -0,0 +1,53 @@
+"""
+Tests for database.sales_analytics
+"""
+
+import csv
+
+from database.sales_analytics import GENERATED_LABEL, update_sales_analysis
+
+def add_sale(db, set_name, quantity, sale_price, shipping_charged=1.0, shipping_cost=0.5,
+             ebay_fees=0.25, sale_date='2025-04-18'):
+    with db.conn:
+        db.conn.execute('''
+            INSERT INTO pack_sales (set_name, quantity, sale_price, shipping_charged,
+                                    shipping_cost, ebay_fees, sale_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (set_name, quantity, sale_price, shipping_charged, shipping_cost, ebay_fees, sale_date))
+
+def read_report(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+def test_first_update_includes_untouched_sets(db, workdir):
+    add_sale(db, 'Mask of Change', 2, 10.0)
+    add_sale(db, 'Pokemon 151', 1, 20.0)
+    report = update_sales_analysis(db, {'Mask of Change'}, str(workdir / 'report.csv'))
+
+    names = {row[0] for row in read_report(report)}
+    assert {'Mask of Change', 'Pokemon 151'} <= names
+
+def test_report_sections_and_figures(db, workdir):
+    add_sale(db, 'Mask of Change', 2, 10.0)
+    add_sale(db, 'Mask of Change', 1, 0.0, shipping_charged=0.0, shipping_cost=0.42)
+    add_sale(db, 'Bulk lot of commons', 1, 4.5)
+    rows = read_report(update_sales_analysis(db, None, str(workdir / 'report.csv')))
+
+    titles = [row[0] for row in rows]
+    for section in ("Pack Sales Analysis", "Slab Sales Analysis", "Uncategorized Listings",
+                    "Refunded/Zero-Value Orders", "Overall Summary", GENERATED_LABEL):
+        assert section in titles
+    mask = rows[titles.index('Mask of Change')]
+    # Orders, units, item sales, total revenue (items + shipping charged), refunded orders
+    assert (mask[1], mask[2], mask[3], mask[7], mask[13]) == ('1', '2', '$10.00', '$11.00', '1')
+    assert rows[titles.index('Bulk lot of commons')][2] == '$4.50'
+    assert rows[titles.index('Total Refunded Orders')][1] == '1'
+
+def test_foreign_report_is_kept(db, workdir):
+    path = workdir / 'report.csv'
+    path.write_text('Pack Sales Analysis\nexported by eBay\n')
+    add_sale(db, 'Mask of Change', 2, 10.0)
+    update_sales_analysis(db, None, str(path))
+    update_sales_analysis(db, None, str(path))
+
+    assert (workdir / 'report.original.csv').read_text() == 'Pack Sales Analysis\nexported by eBay\n'
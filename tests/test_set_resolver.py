@@ -0,0 +1,57 @@
+"""
+Tests for database.set_resolver
+"""
+
+import json
+import os
+
+import pytest
+
+from database.set_resolver import SetResolver, get_set_resolver
+
+SETS = {"series": {
+    "scarlet_and_violet": {"main_sets": [
+        {"name": "Battle Partners", "code": "sv9"},
+        {"name": "Pokemon Card 151", "code": "sv2a"},
+        {"name": "Mask of Change", "code": "sv6"},
+    ], "special_sets": [
+        {"name": "Shiny Treasure ex", "code": "sv4a"},
+    ]},
+    "sword_and_shield": {"main_sets": [
+        {"name": "VSTAR Universe", "code": "s12a"},
+        {"name": "Star Birth", "code": "s9"},
+        {"name": "Lost Abyss", "code": "s11"},
+    ]},
+}}
+
+@pytest.fixture
+def resolver():
+    return SetResolver(SETS)
+
+@pytest.mark.parametrize('name, expected', [
+    ('Battle Partners', 'Battle Partners'),
+    ('Pokemon Japanese SV9-Battle Partners Booster Box', 'Battle Partners'),
+    ('SCARLET & VIOLET MASK OF CHANGE', 'Mask of Change'),
+    ('Shiny Treasure', 'Shiny Treasure ex'),
+    ('sv2a', 'Pokemon Card 151'),
+    ('Pokémon Japanese VSTAR Universe', 'VSTAR Universe'),
+    ('Battle Partner', 'Battle Partners'),
+])
+def test_resolves_marketplace_names(resolver, name, expected):
+    assert resolver.resolve(name) == expected
+
+@pytest.mark.parametrize('name', ['', 'Bulk lot of commons', 'Booster Box'])
+def test_unmatched_names_resolve_to_none(resolver, name):
+    assert resolver.resolve(name) is None
+
+def test_get_set_resolver_rebuilds_when_the_file_changes(workdir):
+    path = workdir / 'sets.json'
+    path.write_text(json.dumps(SETS))
+    first = get_set_resolver(str(path))
+    assert get_set_resolver(str(path)) is first
+
+    changed = {"series": {"scarlet_and_violet": {"main_sets": [{"name": "Paradise Dragona", "code": "sv7a"}]}}}
+    path.write_text(json.dumps(changed))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert get_set_resolver(str(path)).resolve('sv7a') == 'Paradise Dragona'